@@ -3,9 +3,8 @@ from aiogram import Bot, Dispatcher, types
 from aiogram.types import ParseMode
 from aiogram.utils import executor
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import pandas as pd
-import numpy as np
+from embedding_index import KNOWLEDGE_BASE_PATH, load_or_build_index
 
 # Инициализация бота
 API_TOKEN = 'TOKEN'  # Замените на свой API token
@@ -13,7 +12,8 @@ bot = Bot(token=API_TOKEN)
 dp = Dispatcher(bot)
 
 # Загрузка предобученной модели для получения векторов предложений
-model = SentenceTransformer('all-MiniLM-L6-v2')
+MODEL_NAME = 'all-MiniLM-L6-v2'
+model = SentenceTransformer(MODEL_NAME)
 
 # Загрузка данных из CSV-файла
 def load_knowledge_base(file_path):
@@ -21,22 +21,35 @@ def load_knowledge_base(file_path):
     knowledge_base = df.to_dict(orient='records')
     return knowledge_base
 
-# Преобразование вопросов из базы знаний в векторы
-def encode_questions(knowledge_base):
+# Вектора вопросов базы знаний: считаются один раз и хранятся на диске рядом с CSV
+def load_question_index(file_path, knowledge_base):
     questions = [item['Вопрос'] for item in knowledge_base]
-    question_embeddings = model.encode(questions)
-    return question_embeddings
-
-# Функция для поиска наиболее схожего вопроса и получения ответа
-def get_answer(user_question, knowledge_base):
-    user_embedding = model.encode([user_question])
-    question_embeddings = encode_questions(knowledge_base)
-    similarities = cosine_similarity(user_embedding, question_embeddings)
-    most_similar_index = np.argmax(similarities)
+    return load_or_build_index(file_path, questions, model, MODEL_NAME)
+
+# Строки базы по категориям (колонка «Категория», её заполняет ingest_chat.py)
+CATEGORY_COLUMN = 'Категория'
+ALL_CATEGORIES = "Все категории"
+
+def build_category_rows(knowledge_base):
+    category_rows = {}
+    for row, item in enumerate(knowledge_base):
+        category = item.get(CATEGORY_COLUMN)
+        if isinstance(category, str) and category:
+            category_rows.setdefault(category, []).append(row)
+    return category_rows
+
+# Функция для поиска наиболее схожего вопроса и получения ответа; category сужает поиск до своих строк
+def get_answer(user_question, knowledge_base, category=None):
+    user_embedding = model.encode(user_question, normalize_embeddings=True)
+    most_similar_index = question_index.most_similar(user_embedding, category_rows.get(category))
     return knowledge_base[most_similar_index]['Ответ']
 
 # Загрузка базы знаний
-knowledge_base = load_knowledge_base('База данных - Лист1.csv')
+knowledge_base = load_knowledge_base(KNOWLEDGE_BASE_PATH)
+question_index = load_question_index(KNOWLEDGE_BASE_PATH, knowledge_base)
+category_rows = build_category_rows(knowledge_base)
+# Выбранная пользователем категория: user_id -> категория
+user_categories = {}
 
 # Логирование
 logging.basicConfig(level=logging.INFO)
@@ -46,11 +59,32 @@ logging.basicConfig(level=logging.INFO)
 async def send_welcome(message: types.Message):
     await message.reply("Привет! Задайте ваш вопрос, и я постараюсь ответить.")
 
+# Хэндлер для команды /category: выбор категории, в которой искать ответ
+@dp.message_handler(commands=['category'])
+async def choose_category(message: types.Message):
+    if not category_rows:
+        await message.reply("В базе знаний нет категорий.")
+        return
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    for category in [ALL_CATEGORIES] + sorted(category_rows):
+        markup.add(types.KeyboardButton(category))
+    await message.reply("Выберите категорию вопроса", reply_markup=markup)
+
+# Хэндлер для кнопок категорий
+@dp.message_handler(lambda message: message.text == ALL_CATEGORIES or message.text in category_rows)
+async def set_category(message: types.Message):
+    if message.text == ALL_CATEGORIES:
+        user_categories.pop(message.from_user.id, None)
+    else:
+        user_categories[message.from_user.id] = message.text
+    await message.answer(f"Ищу ответы в категории: {message.text}. Задайте ваш вопрос",
+                         reply_markup=types.ReplyKeyboardRemove())
+
 # Хэндлер для текста (обрабатывает вопросы пользователя)
 @dp.message_handler(lambda message: message.text != "Задать новый вопрос")
 async def answer_question(message: types.Message):
     user_question = message.text
-    answer = get_answer(user_question, knowledge_base)
+    answer = get_answer(user_question, knowledge_base, user_categories.get(message.from_user.id))
     
     # Отправка ответа на вопрос
     await message.reply(f"Ответ: {answer}\n", reply_markup=types.ReplyKeyboardRemove())
@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Версия формата файла индекса; при её смене индекс пересобирается целиком
+INDEX_FORMAT = 1
+# CSV базы знаний по умолчанию: его читает bot.py и пополняет ingest_chat.py
+KNOWLEDGE_BASE_PATH = 'База данных - Лист1.csv'
+
+
+def file_hash(file_path):
+    """sha256 содержимого файла — ключ актуальности индекса"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_hash(text):
+    return hashlib.sha1(str(text).encode('utf-8')).hexdigest()
+
+
+class EmbeddingIndex:
+    """Сохранённые на диск нормированные вектора вопросов базы знаний.
+
+    Файл индекса (.npz) хранит вектора, хэш каждого вопроса, хэш CSV и имя
+    модели. Если CSV не менялся, индекс просто загружается; если менялся —
+    заново кодируются только вопросы с новыми хэшами, остальные вектора
+    берутся из старого индекса. Похожесть — скалярное произведение
+    нормированных векторов (то же, что косинусная мера).
+    """
+
+    def __init__(self, embeddings, row_hashes, csv_hash, model_name):
+        self.embeddings = embeddings
+        self.row_hashes = row_hashes
+        self.csv_hash = csv_hash
+        self.model_name = model_name
+
+    @classmethod
+    def load(cls, index_path):
+        with np.load(index_path, allow_pickle=False) as data:
+            if int(data['format']) != INDEX_FORMAT:
+                raise ValueError(f"Unsupported index format: {int(data['format'])}")
+            return cls(data['embeddings'], list(data['row_hashes']), str(data['csv_hash']), str(data['model']))
+
+    def save(self, index_path):
+        # Пишем во временный файл и подменяем атомарно, чтобы не оставить битый индекс
+        tmp_path = index_path + '.tmp.npz'
+        np.savez(
+            tmp_path,
+            format=INDEX_FORMAT,
+            embeddings=self.embeddings,
+            row_hashes=np.array(self.row_hashes),
+            csv_hash=self.csv_hash,
+            model=self.model_name
+        )
+        os.replace(tmp_path, index_path)
+
+    @classmethod
+    def build(cls, questions, model, model_name, csv_hash, previous=None):
+        """Кодирует вопросы, переиспользуя вектора из previous по хэшам"""
+        row_hashes = [text_hash(question) for question in questions]
+        known = {}
+        if previous is not None and previous.model_name == model_name:
+            known = dict(zip(previous.row_hashes, previous.embeddings))
+
+        missing = {}
+        for question, row_hash in zip(questions, row_hashes):
+            if row_hash not in known:
+                missing.setdefault(row_hash, question)
+        if missing:
+            vectors = model.encode(list(missing.values()), normalize_embeddings=True)
+            known.update(zip(missing.keys(), vectors))
+        logger.info(f"Embedding index: {len(questions) - len(missing)} rows reused, {len(missing)} encoded")
+
+        dim = model.get_sentence_embedding_dimension()
+        embeddings = np.array([known[row_hash] for row_hash in row_hashes], dtype=np.float32).reshape(-1, dim)
+        return cls(embeddings, row_hashes, csv_hash, model_name)
+
+    def append(self, questions, embeddings, csv_hash):
+        """Новый индекс с дописанными в конец строками (вектора уже посчитаны и нормированы)"""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.embeddings.shape[1])
+        return EmbeddingIndex(
+            np.concatenate([self.embeddings, embeddings]),
+            self.row_hashes + [text_hash(question) for question in questions],
+            csv_hash,
+            self.model_name
+        )
+
+    def most_similar(self, query_embedding, rows=None):
+        """Индекс строки с наибольшей похожестью на нормированный вектор запроса.
+
+        rows — необязательный список строк, среди которых искать (например,
+        строки одной категории); пустой список — поиск по всей базе.
+        """
+        if rows is None or not len(rows):
+            return int(np.argmax(self.embeddings @ query_embedding))
+        rows = np.asarray(rows)
+        return int(rows[np.argmax(self.embeddings[rows] @ query_embedding)])
+
+
+def load_or_build_index(csv_path, questions, model, model_name, index_path=None):
+    """Загружает индекс для CSV или обновляет его, если CSV или модель изменились"""
+    index_path = index_path or os.path.splitext(csv_path)[0] + '.index.npz'
+    csv_hash = file_hash(csv_path)
+
+    previous = None
+    if os.path.exists(index_path):
+        try:
+            previous = EmbeddingIndex.load(index_path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Embedding index {index_path} is unreadable, rebuilding: {e}")
+        else:
+            if previous.csv_hash == csv_hash and previous.model_name == model_name:
+                logger.info(f"Embedding index loaded: {index_path} ({len(previous.row_hashes)} rows)")
+                return previous
+
+    index = EmbeddingIndex.build(questions, model, model_name, csv_hash, previous)
+    index.save(index_path)
+    return index
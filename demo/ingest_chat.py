@@ -0,0 +1,204 @@
+import argparse
+import csv
+import logging
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from embedding_index import KNOWLEDGE_BASE_PATH, EmbeddingIndex, file_hash, load_or_build_index
+
+logger = logging.getLogger(__name__)
+
+# Пополнение базы знаний парами вопрос → ответ из истории чата (base.json).
+#
+# base.json — словарь «категория → список сообщений» с полями id, date, from,
+# text, reply_to_message_id. Файл читается потоково (ijson), целиком в память
+# не загружается, и проходится дважды: в первый раз собираются только номера
+# сообщений и ссылки «ответ → сообщение», во второй — сохраняются лишь
+# сообщения, на которые ответили, и сами ответы.
+#
+# Пара — вопрос участника и ответ на него отвечающего (консультанта).
+# Отвечающие — авторы из --answerer или все, кто ответил не меньше
+# --min-replies раз. Несколько ответов одного консультанта на вопрос
+# склеиваются по времени. Пара отбрасывается, если её вопрос по косинусу
+# не ниже --dedup-threshold совпадает с вопросом базы или уже принятой новой
+# пары. Принятые пары дописываются в CSV базы с колонкой «Категория», их
+# вектора — в индекс embedding_index.py, без перекодирования старых строк.
+#
+#     python ingest_chat.py --kb 'База данных - Лист1.csv'
+
+QUESTION_COLUMN = 'Вопрос'
+ANSWER_COLUMN = 'Ответ'
+CATEGORY_COLUMN = 'Категория'
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+
+def iter_messages(file_path):
+    """Сообщения base.json по одному: (категория, словарь сообщения)"""
+    import ijson
+
+    with open(file_path, 'rb') as f:
+        depth = 0
+        category = None
+        builder = None
+        for prefix, event, value in ijson.parse(f):
+            if event in ('start_map', 'start_array'):
+                depth += 1
+                if event == 'start_map' and depth == 3:
+                    builder = ijson.ObjectBuilder()
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+            elif event == 'map_key' and depth == 1:
+                category = value
+            if builder is not None:
+                builder.event(event, value)
+                if depth == 2:
+                    yield category, builder.value
+                    builder = None
+
+
+def clean_text(text):
+    return re.sub(r'\s+', ' ', str(text or '')).strip()
+
+
+def extract_pairs(file_path, answerers=None, min_replies=10, min_question_chars=15):
+    """Пары (вопрос, ответ, категория вопроса) из цепочек ответов, в порядке вопросов в файле"""
+    message_ids = set()
+    links = []
+    for _, message in iter_messages(file_path):
+        message_ids.add(message['id'])
+        if message.get('reply_to_message_id'):
+            links.append((message.get('from'), message['reply_to_message_id']))
+    # Ответы на сообщения, которых нет в выгрузке, не считаем
+    links = [(author, parent) for author, parent in links if parent in message_ids]
+    referenced = {parent for _, parent in links}
+    reply_counts = Counter(author for author, _ in links)
+    if not answerers:
+        answerers = {author for author, count in reply_counts.items() if count >= min_replies}
+    logger.info(f"Answerers: {', '.join(sorted(answerers)) or '-'}")
+
+    questions = {}
+    replies = []
+    for category, message in iter_messages(file_path):
+        if message['id'] in referenced and message.get('from') not in answerers:
+            questions[message['id']] = (category, message)
+        if message.get('reply_to_message_id') and message.get('from') in answerers:
+            replies.append(message)
+
+    answers = {}
+    for reply in sorted(replies, key=lambda message: message.get('date') or ''):
+        question_id = reply['reply_to_message_id']
+        if question_id not in questions:
+            continue
+        author, parts = answers.setdefault(question_id, (reply['from'], []))
+        # Отвечает один консультант: реплики других на тот же вопрос не смешиваем
+        if reply['from'] == author and clean_text(reply['text']):
+            parts.append(clean_text(reply['text']))
+
+    pairs = []
+    for question_id, (category, message) in questions.items():
+        question = clean_text(message['text'])
+        _, parts = answers.get(question_id, (None, []))
+        if len(question) >= min_question_chars and parts:
+            pairs.append((question, ' '.join(parts), category))
+    return pairs
+
+
+def deduplicate(embeddings, known_embeddings, threshold):
+    """Номера пар, вопросы которых не совпадают ни с базой, ни с ранее принятыми парами"""
+    accepted = []
+    accepted_embeddings = []
+    for i, embedding in enumerate(embeddings):
+        for matrix in (known_embeddings, np.array(accepted_embeddings).reshape(-1, len(embedding))):
+            if len(matrix) and float(np.max(matrix @ embedding)) >= threshold:
+                break
+        else:
+            accepted.append(i)
+            accepted_embeddings.append(embedding)
+    return accepted
+
+
+def append_rows(kb_path, rows):
+    """Дописывает строки в CSV базы; если в нём ещё нет колонки категории — переписывает с новым заголовком"""
+    fieldnames = [QUESTION_COLUMN, ANSWER_COLUMN, CATEGORY_COLUMN]
+    existing = []
+    if os.path.exists(kb_path):
+        with open(kb_path, encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            fieldnames = list(reader.fieldnames or fieldnames)
+            if CATEGORY_COLUMN not in fieldnames:
+                fieldnames.append(CATEGORY_COLUMN)
+                existing = list(reader)
+            else:
+                existing = None
+
+    if existing is None:
+        with open(kb_path, 'a', encoding='utf-8', newline='') as f:
+            csv.DictWriter(f, fieldnames, restval='').writerows(rows)
+        return
+
+    tmp_path = kb_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames, restval='')
+        writer.writeheader()
+        writer.writerows(existing)
+        writer.writerows(rows)
+    os.replace(tmp_path, kb_path)
+
+
+def ingest(chat_path, kb_path, model, model_name=MODEL_NAME, answerers=None, min_replies=10,
+           dedup_threshold=0.95, dry_run=False):
+    """Добавляет в базу новые пары из истории чата; возвращает число добавленных"""
+    pairs = extract_pairs(chat_path, set(answerers or ()), min_replies)
+    logger.info(f"{chat_path}: {len(pairs)} question/answer pairs")
+    if not pairs:
+        return 0
+
+    knowledge_base = []
+    if os.path.exists(kb_path):
+        with open(kb_path, encoding='utf-8', newline='') as f:
+            knowledge_base = list(csv.DictReader(f))
+    # Индекс базы до пополнения: вектора старых строк берутся из него, а не кодируются заново
+    index = None
+    if knowledge_base:
+        index = load_or_build_index(kb_path, [item[QUESTION_COLUMN] for item in knowledge_base], model, model_name)
+
+    embeddings = model.encode([question for question, _, _ in pairs], normalize_embeddings=True)
+    known = index.embeddings if index is not None else np.empty((0, embeddings.shape[1]), dtype=np.float32)
+    rows = deduplicate(embeddings, known, dedup_threshold)
+    accepted = [pairs[i] for i in rows]
+    logger.info(f"{len(accepted)} new pairs, {len(pairs) - len(accepted)} duplicates skipped")
+    if dry_run or not accepted:
+        return len(accepted)
+
+    append_rows(kb_path, [
+        {QUESTION_COLUMN: question, ANSWER_COLUMN: answer, CATEGORY_COLUMN: category}
+        for question, answer, category in accepted
+    ])
+    index_path = os.path.splitext(kb_path)[0] + '.index.npz'
+    if index is None:
+        # Базы не было: в CSV только принятые пары, их вектора уже посчитаны для отсева дублей
+        index = EmbeddingIndex(known, [], None, model_name)
+    index.append([question for question, _, _ in accepted], embeddings[rows], file_hash(kb_path)).save(index_path)
+    return len(accepted)
+
+
+if __name__ == '__main__':
+    from sentence_transformers import SentenceTransformer
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Пополнение базы знаний парами вопрос-ответ из base.json")
+    parser.add_argument('--chat', default='base.json')
+    parser.add_argument('--kb', default=KNOWLEDGE_BASE_PATH)
+    parser.add_argument('--model', default=MODEL_NAME)
+    parser.add_argument('--answerer', action='append', help="автор ответов; по умолчанию — по числу ответов")
+    parser.add_argument('--min-replies', type=int, default=10)
+    parser.add_argument('--dedup-threshold', type=float, default=0.95)
+    parser.add_argument('--dry-run', action='store_true', help="только посчитать новые пары")
+    args = parser.parse_args()
+
+    added = ingest(args.chat, args.kb, SentenceTransformer(args.model), args.model, args.answerer,
+                   args.min_replies, args.dedup_threshold, args.dry_run)
+    print(f"Добавлено пар: {added}")
@@ -1,10 +1,10 @@
 import pandas as pd
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
+from embedding_index import load_or_build_index
 
 # Загрузка предобученной модели для получения векторов предложений
-model = SentenceTransformer('all-MiniLM-L6-v2')
+MODEL_NAME = 'all-MiniLM-L6-v2'
+model = SentenceTransformer(MODEL_NAME)
 
 # Загрузка данных из CSV-файла
 def load_knowledge_base(file_path):
@@ -14,31 +14,26 @@ def load_knowledge_base(file_path):
     knowledge_base = df.to_dict(orient='records')
     return knowledge_base
 
-# Преобразование вопросов из базы знаний в векторы
-def encode_questions(knowledge_base):
+# Вектора вопросов базы знаний: считаются один раз и хранятся на диске рядом с CSV
+def load_question_index(file_path, knowledge_base):
     questions = [item['Вопрос'] for item in knowledge_base]
-    question_embeddings = model.encode(questions)
-    return question_embeddings
+    return load_or_build_index(file_path, questions, model, MODEL_NAME)
 
 # Функция для поиска наиболее схожего вопроса и получения ответа
 def get_answer(user_question, knowledge_base):
-    # Преобразуем запрос пользователя в вектор
-    user_embedding = model.encode([user_question])
+    # Преобразуем запрос пользователя в нормированный вектор
+    user_embedding = model.encode(user_question, normalize_embeddings=True)
 
-    # Преобразуем вопросы из базы знаний в векторы
-    question_embeddings = encode_questions(knowledge_base)
-
-    # Вычисляем косинусное сходство между запросом и вопросами в базе знаний
-    similarities = cosine_similarity(user_embedding, question_embeddings)
-
-    # Находим индекс самого похожего вопроса
-    most_similar_index = np.argmax(similarities)
+    # Находим самый похожий вопрос по готовым векторам базы знаний
+    most_similar_index = question_index.most_similar(user_embedding)
 
     # Возвращаем ответ, соответствующий наиболее похожему вопросу
     return knowledge_base[most_similar_index]['Ответ']
 
 # Пример использования
-knowledge_base = load_knowledge_base('База данных - Лист1.csv')
+KNOWLEDGE_BASE_PATH = 'База данных - Лист1.csv'
+knowledge_base = load_knowledge_base(KNOWLEDGE_BASE_PATH)
+question_index = load_question_index(KNOWLEDGE_BASE_PATH, knowledge_base)
 
 user_question = input("Задайте вопрос: ")
 answer = get_answer(user_question, knowledge_base)
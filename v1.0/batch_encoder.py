@@ -0,0 +1,97 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Кодирование вопросов пачками вне event loop.
+#
+# Обработчики вызывают await encoder.encode(text). Запросы копятся в очереди:
+# первый запрос открывает окно max_wait секунд, за которое пачка добирается до
+# max_batch_size, после чего вся пачка одним вызовом model.encode уходит в
+# отдельный поток. Пока поток занят, новые запросы продолжают копиться, и
+# следующая пачка получается тем больше, чем выше нагрузка. Event loop при
+# этом не блокируется.
+
+
+class BatchEncoder:
+    def __init__(self, model, max_batch_size=32, max_wait=0.005, executor=None, **encode_params):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.encode_params = encode_params
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='encoder')
+        self._queue = None
+        self._task = None
+        self.batches = 0
+        self.encoded = 0
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Запросы, не попавшие в пачку, отменяем, чтобы их обработчики не зависли
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+
+    async def encode(self, text):
+        """Вектор одного текста; вызов ждёт, пока его пачка будет закодирована"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((text, future))
+        return await future
+
+    async def _collect(self, batch):
+        # Пачка накапливается в списке вызывающего: при отмене уже взятые из очереди запросы не теряются
+        batch.append(await self._queue.get())
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    def _encode_batch(self, texts):
+        return np.asarray(self.model.encode(texts, batch_size=len(texts), **self.encode_params))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = []
+            try:
+                await self._collect(batch)
+                # Вызывающий мог уйти по таймауту — его текст не кодируем
+                batch = [(text, future) for text, future in batch if not future.done()]
+                if not batch:
+                    continue
+                vectors = await loop.run_in_executor(self._executor, self._encode_batch, [text for text, _ in batch])
+            except asyncio.CancelledError:
+                # stop(): запросы текущей пачки отменяем, иначе их обработчики ждали бы вечно
+                for _, future in batch:
+                    future.cancel()
+                raise
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.encoded += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
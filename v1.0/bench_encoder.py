@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+import numpy as np
+
+from batch_encoder import BatchEncoder
+
+# Бенчмарк кодирования вопросов: QPS и задержка при разном числе одновременных клиентов.
+#
+# blocking — как было в bot.py: model.encode в обработчике, event loop стоит;
+# batch — BatchEncoder с заданными размером пачки и окном сбора.
+# По умолчанию грузится настоящая модель; --fake подменяет её моделью, которая
+# «считает» пачку за fixed_ms + per_item_ms * n (time.sleep отпускает GIL, как torch).
+#
+#     python bench_encoder.py --clients 1 8 32 --waits 0 0.005 0.01
+#     python bench_encoder.py --fake
+
+
+class FakeModel:
+    def __init__(self, fixed_ms, per_item_ms, dim=384):
+        self.fixed = fixed_ms / 1000
+        self.per_item = per_item_ms / 1000
+        self.dim = dim
+
+    def encode(self, texts, batch_size=32, **params):
+        single = isinstance(texts, str)
+        count = 1 if single else len(texts)
+        time.sleep(self.fixed + self.per_item * count)
+        vectors = np.zeros((count, self.dim), dtype=np.float32)
+        return vectors[0] if single else vectors
+
+
+async def run_clients(encode, questions, clients, requests):
+    latencies = []
+    counter = iter(range(requests))
+
+    async def client():
+        for i in counter:
+            started = time.perf_counter()
+            await encode(questions[i % len(questions)])
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return requests / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QPS и задержка кодирования вопросов")
+    parser.add_argument('--model', default='all-MiniLM-L12-v2')
+    parser.add_argument('--fake', action='store_true', help="модель-заглушка вместо SentenceTransformer")
+    parser.add_argument('--fake-fixed-ms', type=float, default=8)
+    parser.add_argument('--fake-per-item-ms', type=float, default=1.5)
+    parser.add_argument('--csv', default='База данных - Лист1.csv')
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--waits', type=float, nargs='+', default=[0, 0.005, 0.01])
+    args = parser.parse_args()
+
+    if args.fake:
+        model = FakeModel(args.fake_fixed_ms, args.fake_per_item_ms)
+    else:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(args.model)
+    try:
+        import pandas as pd
+        questions = pd.read_csv(args.csv)['Вопрос'].astype(str).tolist()
+    except (ImportError, OSError):
+        questions = [f"Вопрос номер {i}?" for i in range(1000)]
+    model.encode(questions[:8])  # прогрев
+
+    async def blocking(text):
+        return model.encode([text])[0]
+
+    print(f"{'mode':<24}{'clients':>8}{'QPS':>8}{'p50, ms':>10}{'p95, ms':>10}{'avg batch':>11}")
+    for clients in args.clients:
+        qps, p50, p95 = asyncio.run(run_clients(blocking, questions, clients, args.requests))
+        print(f"{'blocking':<24}{clients:>8}{qps:>8.0f}{p50 * 1000:>10.1f}{p95 * 1000:>10.1f}{1:>11.1f}")
+        for wait in args.waits:
+            encoder = BatchEncoder(model, args.batch_size, wait)
+
+            async def batched():
+                try:
+                    return await run_clients(encoder.encode, questions, clients, args.requests)
+                finally:
+                    await encoder.stop()
+
+            qps, p50, p95 = asyncio.run(batched())
+            mode = f"batch {args.batch_size}, wait {wait * 1000:g} ms"
+            average = encoder.encoded / max(encoder.batches, 1)
+            print(f"{mode:<24}{clients:>8}{qps:>8.0f}{p50 * 1000:>10.1f}{p95 * 1000:>10.1f}{average:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import argparse
+import time
+
+import numpy as np
+
+from search import BruteForceIndex, HNSWIndex, IVFIndex, normalize_query
+
+# Бенчмарк бэкендов поиска: recall@1 относительно точного перебора и запросы в секунду.
+#
+# Базы на 5k/50k/500k строк получаются размножением реальных векторов из
+# question_embeddings (или случайных кластеров, если хранилища нет) с шумом;
+# запросы — зашумлённые строки базы. Вектора хранятся во float16, как в
+# embedding_store.py.
+#
+#     python bench_search.py
+#     python bench_search.py --sizes 5000 50000 --n-probe 4 8 16 --queries 500
+
+
+def make_base(rows, dim, noise, rng, seed_vectors=None):
+    if seed_vectors is None:
+        seed_vectors = rng.normal(size=(max(64, rows // 50), dim)).astype(np.float32)
+    seed_vectors = seed_vectors / np.linalg.norm(seed_vectors, axis=1, keepdims=True)
+    base = np.empty((rows, seed_vectors.shape[1]), dtype=np.float16)
+    for start in range(0, rows, 65536):
+        count = min(65536, rows - start)
+        block = seed_vectors[rng.integers(len(seed_vectors), size=count)]
+        block = block + rng.normal(scale=noise, size=block.shape).astype(np.float32)
+        base[start:start + count] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return base
+
+
+def measure(index, queries, truth, **params):
+    started = time.perf_counter()
+    found = [index.search(query, 1, **params)[0][0] for query in queries]
+    elapsed = time.perf_counter() - started
+    return np.mean(np.array(found) == truth), len(queries) / elapsed
+
+
+def sklearn_qps(base, queries):
+    try:
+        from sklearn.metrics.pairwise import cosine_similarity
+    except ImportError:
+        return None
+    started = time.perf_counter()
+    for query in queries:
+        np.argmax(cosine_similarity(query[None, :], base))
+    return len(queries) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение бэкендов поиска ближайшего вопроса")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5000, 50000, 500000])
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--noise', type=float, default=0.03, help="шум при размножении векторов базы")
+    parser.add_argument('--n-probe', type=int, nargs='+', default=[1, 4, 16, 32])
+    parser.add_argument('--ef', type=int, nargs='+', default=[16, 64, 128])
+    parser.add_argument('--store', default='question_embeddings', help="префикс хранилища с исходными векторами")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    seed_vectors, dim = None, 384
+    try:
+        from embedding_store import open_store
+        store = open_store(args.store)
+        seed_vectors = store.to_float32()
+        dim = seed_vectors.shape[1]
+        print(f"Исходные вектора: {args.store} ({store.rows}x{dim})")
+    except (OSError, ValueError, KeyError):
+        print("Хранилище не найдено, используются случайные кластеры")
+
+    for rows in args.sizes:
+        base = make_base(rows, dim, args.noise, rng, seed_vectors)
+        picks = base[rng.integers(rows, size=args.queries)].astype(np.float32)
+        queries = [normalize_query(q) for q in picks + rng.normal(scale=args.noise * 2, size=picks.shape).astype(np.float32)]
+
+        print(f"\n=== {rows} строк, {base.nbytes / 2 ** 20:.0f} MiB float16 ===")
+        print(f"{'backend':<22}{'build, s':>10}{'recall@1':>10}{'QPS':>10}")
+
+        # Эталон — точный перебор всеми запросами сразу (матричное умножение блоками)
+        query_matrix = np.stack(queries)
+        best_scores = np.full(len(queries), -np.inf, dtype=np.float32)
+        truth = np.zeros(len(queries), dtype=np.int64)
+        for start in range(0, rows, 65536):
+            scores = query_matrix @ base[start:start + 65536].astype(np.float32).T
+            block_best = np.argmax(scores, axis=1)
+            better = scores[np.arange(len(queries)), block_best] > best_scores
+            best_scores[better] = scores[np.arange(len(queries)), block_best][better]
+            truth[better] = start + block_best[better]
+
+        # Перебор медленный на больших базах, поэтому его QPS меряем на части запросов
+        sample = slice(0, max(5, min(len(queries), 200000 // rows * 20)))
+        recall, qps = measure(BruteForceIndex(base, in_memory=False), queries[sample], truth[sample])
+        print(f"{'brute float16':<22}{0:>10.2f}{recall:>10.3f}{qps:>10.0f}")
+        started = time.perf_counter()
+        brute = BruteForceIndex(base, in_memory=True)
+        build = time.perf_counter() - started
+        recall, qps = measure(brute, queries[sample], truth[sample])
+        print(f"{'brute float32 in RAM':<22}{build:>10.2f}{recall:>10.3f}{qps:>10.0f}")
+        del brute
+
+        qps = sklearn_qps(base, queries[sample])
+        if qps is not None:
+            print(f"{'sklearn cosine':<22}{0:>10.2f}{1:>10.3f}{qps:>10.0f}")
+
+        started = time.perf_counter()
+        ivf = IVFIndex(base)
+        build = time.perf_counter() - started
+        for n_probe in args.n_probe:
+            recall, qps = measure(ivf, queries, truth, n_probe=n_probe)
+            print(f"{f'ivf {ivf.n_lists} n_probe={n_probe}':<22}{build:>10.2f}{recall:>10.3f}{qps:>10.0f}")
+
+        try:
+            started = time.perf_counter()
+            hnsw = HNSWIndex(base)
+            build = time.perf_counter() - started
+        except ImportError:
+            print("hnsw: hnswlib не установлен")
+            continue
+        for ef in args.ef:
+            recall, qps = measure(hnsw, queries, truth, ef=ef)
+            print(f"{f'hnsw ef={ef}':<22}{build:>10.2f}{recall:>10.3f}{qps:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Время старта reply.py до первого ответа, каждый замер — в новом процессе.
+#
+# cold — SentenceTransformer (импорт torch/transformers и загрузка весов);
+# warm — выгруженный кодировщик из encoder/ (export_encoder.py) и memmap-хранилище векторов.
+#
+#     python export_encoder.py && python bench_startup.py --runs 5
+
+CHILD = r'''
+import json, resource, sys, time
+started = time.perf_counter()
+import reply
+imported = time.perf_counter()
+reply.ENCODER_DIR = sys.argv[1] or None
+reply.get_search_index()
+index_loaded = time.perf_counter()
+reply.get_model()
+model_loaded = time.perf_counter()
+reply.get_answer("Какие документы нужны для поступления?")
+answered = time.perf_counter()
+print(json.dumps({
+    "import": imported - started,
+    "index": index_loaded - imported,
+    "model": model_loaded - index_loaded,
+    "first_answer": answered - model_loaded,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "encoder": type(reply.get_model()).__name__,
+}))
+'''
+
+
+def run(encoder_dir):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD, encoder_dir],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    total = time.perf_counter() - started
+    if result.returncode != 0:
+        raise SystemExit(result.stderr)
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    stats['total'] = total
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время старта до первого ответа: cold и warm")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--encoder-dir', default='encoder')
+    args = parser.parse_args()
+
+    modes = [('cold', '')]
+    if os.path.exists(os.path.join(args.encoder_dir, 'encoder.json')):
+        modes.append(('warm', args.encoder_dir))
+    else:
+        print(f"{args.encoder_dir}/ не найден — warm пропущен (сначала python export_encoder.py)")
+
+    columns = ('total', 'import', 'index', 'model', 'first_answer')
+    print(f"{'mode':<6}{'encoder':<18}" + ''.join(f"{name + ', s':>16}" for name in columns) + f"{'RSS, MB':>10}")
+    for mode, encoder_dir in modes:
+        runs = [run(encoder_dir) for _ in range(args.runs)]
+        medians = {name: statistics.median(r[name] for r in runs) for name in columns + ('rss_mb',)}
+        print(f"{mode:<6}{runs[0]['encoder']:<18}" + ''.join(f"{medians[name]:>16.3f}" for name in columns)
+              + f"{medians['rss_mb']:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
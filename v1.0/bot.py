@@ -2,11 +2,9 @@ from aiogram import Bot, Dispatcher, types
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from aiogram.utils import executor
 import asyncio
-import pandas as pd
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
-import joblib
+import os
+import reply
+from batch_encoder import BatchEncoder
 
 # Создаем экземпляры бота и диспетчера
 API_TOKEN = "TOKEN"
@@ -15,27 +13,46 @@ dp = Dispatcher(bot)
 
 # Глобальные переменные для базы знаний и векторов
 knowledge_base = None
-question_embeddings = None
+search_index = None
 model = None
+encoder = None
 
 # Кнопки
 button_ask_question = KeyboardButton("Задать вопрос")
 keyboard = ReplyKeyboardMarkup(resize_keyboard=True).add(button_ask_question)
 
-# Функции для работы с базой знаний
+# Модель, база знаний, поиск и порог уверенности (SIMILARITY_THRESHOLD) настраиваются в reply.py;
+# вопросы ниже порога уходят в low_confidence_handler.
+# Кодирование вопросов пачками в отдельном потоке (batch_encoder.py): размер пачки и окно сбора в секундах
+ENCODER_MAX_BATCH = 32
+ENCODER_MAX_WAIT = 0.005
 
-def load_knowledge_base(file_path):
-    df = pd.read_csv(file_path)
-    return df.to_dict(orient='records')
+# Чат консультантов (переменная окружения OPERATORS_CHAT_ID), куда пересылаются вопросы без уверенного ответа;
+# если не задан — просить переформулировать
+OPERATORS_CHAT_ID = int(os.environ['OPERATORS_CHAT_ID']) if os.getenv('OPERATORS_CHAT_ID') else None
 
-def load_question_embeddings(file_path):
-    return joblib.load(file_path)
+# Лучший ответ и кандидаты, как reply.get_answer, но вопрос кодируется пачкой в потоке BatchEncoder
+async def get_answer(user_question, knowledge_base, search_index):
+    user_embedding = await encoder.encode(user_question)
+    return reply.pick_answer(reply.rank_answers(user_embedding, knowledge_base, search_index,
+                                                user_question=user_question))
 
-def get_answer(user_question, knowledge_base, question_embeddings):
-    user_embedding = model.encode([user_question])
-    similarities = cosine_similarity(user_embedding, question_embeddings)
-    most_similar_index = np.argmax(similarities)
-    return knowledge_base[most_similar_index]['Ответ']
+# Медленный путь для вопросов без уверенного ответа: консультанты (или генератор ответов)
+async def forward_to_operators(message, candidates):
+    if OPERATORS_CHAT_ID is None:
+        await message.reply("Не нашёл точного ответа на этот вопрос. Попробуйте сформулировать его иначе.")
+        return
+    best = f"{candidates[0][1]:.2f}" if candidates else "-"
+    await message.forward(OPERATORS_CHAT_ID)
+    await bot.send_message(OPERATORS_CHAT_ID, f"Вопрос без уверенного ответа (сходство {best}), user {message.from_user.id}")
+    await message.reply("Передал ваш вопрос консультанту, он ответит в ближайшее время.")
+
+low_confidence_handler = forward_to_operators
+
+# Остановка кодировщика: вопросы, ожидающие вектора, получают отмену, а не зависают
+async def on_shutdown(dp):
+    if encoder is not None:
+        await encoder.stop()
 
 @dp.message_handler(commands=['start'])
 async def send_welcome(message: types.Message):
@@ -49,7 +66,10 @@ async def ask_question(message: types.Message):
 async def handle_question(message: types.Message):
     user_question = message.text
     try:
-        answer = get_answer(user_question, knowledge_base, question_embeddings) + '\n\nЕсли вас не устроил ответ, сформулируйте ваш вопрос более чётко'
+        answer, candidates = await get_answer(user_question, knowledge_base, search_index)
+        if answer is None:
+            await low_confidence_handler(message, candidates)
+            return
         await message.reply(answer)
     except Exception as e:
         await message.reply(f"Произошла ошибка при обработке вопроса: {e}")
@@ -57,8 +77,9 @@ async def handle_question(message: types.Message):
 if __name__ == "__main__":
     # Загружаем базу знаний и векторы один раз при запуске
     print("Загружаем базу знаний и предвычисленные вектора...")
-    knowledge_base = load_knowledge_base('База данных - Лист1.csv')
-    question_embeddings = load_question_embeddings('question_embeddings.pkl')
-    model = SentenceTransformer('all-MiniLM-L12-v2')
+    knowledge_base = reply.get_knowledge_base()
+    search_index = reply.get_search_index()
+    model = reply.get_model()
+    encoder = BatchEncoder(model, ENCODER_MAX_BATCH, ENCODER_MAX_WAIT)
 
-    executor.start_polling(dp, skip_updates=True)
+    executor.start_polling(dp, skip_updates=True, on_shutdown=on_shutdown)
@@ -0,0 +1,47 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from embedding_store import open_store
+
+# Подбор SIMILARITY_THRESHOLD для reply.py (им пользуется и bot.py) без модели и разметки.
+#
+# Каждый вопрос базы по очереди считается вопросом пользователя: ищем самый
+# похожий из остальных (точные дубли текста исключаются) и проверяем, совпал
+# ли ответ. Для каждого порога видно, какая доля вопросов получит ответ
+# сразу и насколько он верен, а какая уйдёт в медленный путь.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Подбор порога уверенности поиска")
+    parser.add_argument('--csv', default='База данных - Лист1.csv')
+    parser.add_argument('--store', default='question_embeddings')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.7, 0.75, 0.8, 0.85, 0.9])
+    args = parser.parse_args()
+
+    knowledge_base = pd.read_csv(args.csv)
+    vectors = open_store(args.store).to_float32()
+    answer_ids = pd.factorize(knowledge_base['Ответ'])[0]
+    question_ids = pd.factorize(knowledge_base['Вопрос'])[0]
+
+    best_rows = np.empty(len(vectors), dtype=np.int64)
+    best_scores = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), 1024):
+        scores = vectors[start:start + 1024] @ vectors.T
+        rows = np.arange(start, start + len(scores))
+        scores[question_ids[rows, None] == question_ids[None, :]] = -1
+        best_rows[rows] = np.argmax(scores, axis=1)
+        best_scores[rows] = scores[np.arange(len(rows)), best_rows[rows]]
+    correct = answer_ids[best_rows] == answer_ids
+
+    print(f"Без порога верных ответов: {correct.mean():.1%}")
+    print(f"{'порог':>6}{'отвечено':>10}{'верно':>8}{'верно ниже порога':>20}")
+    for threshold in args.thresholds:
+        answered = best_scores >= threshold
+        below = f"{correct[~answered].mean():.1%}" if (~answered).any() else "-"
+        print(f"{threshold:>6.2f}{answered.mean():>10.1%}{correct[answered].mean():>8.1%}{below:>20}")
+
+
+if __name__ == '__main__':
+    main()
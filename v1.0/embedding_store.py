@@ -0,0 +1,179 @@
+import numpy as np
+import os
+import hashlib
+import json
+import time
+import argparse
+
+# Хранилище векторов вопросов на диске вместо question_embeddings.pkl.
+#
+# Вектора нормируются (косинусное сходство = скалярное произведение) и
+# пишутся в обычный .npy (float32, float16 или int8 с масштабом на строку),
+# который открывается через np.load(mmap_mode='r'): данные не копируются в
+# память процесса, а читаются из page cache, общего для всех процессов бота.
+# Рядом лежит манифест question_embeddings.meta.json: модель, тип, размер,
+# хэши вопросов (строка i вектора = строка i CSV) и имена файлов текущей версии. Каждая версия
+# пишется в новые файлы, а манифест подменяется последним через os.replace,
+# поэтому читатель всегда видит согласованную версию.
+
+DTYPES = ('float32', 'float16', 'int8')
+DEFAULT_DTYPE = 'float16'
+BLOCK_ROWS = 65536
+
+# Хэш текста вопроса: по нему узнаём строки, вектора которых уже посчитаны
+def question_hash(question):
+    return hashlib.sha1(str(question).encode('utf-8')).hexdigest()
+
+def manifest_path(prefix):
+    return prefix + '.meta.json'
+
+def atomic_write(file_path, write):
+    tmp_path = file_path + '.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, file_path)
+
+def save_npy(file_path, array):
+    # np.save сам дописывает .npy к имени без расширения, поэтому пишем через файловый объект
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+    atomic_write(file_path, write)
+
+def normalize(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return embeddings / norms
+
+def quantize(embeddings, dtype):
+    """Нормированные float32 вектора -> (массив нужного типа, масштабы строк или None)"""
+    if dtype == 'int8':
+        scales = np.abs(embeddings).max(axis=1) / 127
+        scales[scales == 0] = 1
+        return np.round(embeddings / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    return embeddings.astype(dtype), None
+
+
+class EmbeddingStore:
+    """Открытая версия хранилища; vectors — memmap только для чтения"""
+
+    def __init__(self, prefix, manifest, vectors, scales):
+        self.prefix = prefix
+        self.manifest = manifest
+        self.vectors = vectors
+        self.scales = scales
+
+    @property
+    def rows(self):
+        return self.manifest['rows']
+
+    @property
+    def row_hashes(self):
+        return self.manifest['row_hashes']
+
+    def scores(self, query_embedding):
+        """Косинусное сходство запроса со всеми вопросами базы"""
+        query = normalize(np.reshape(query_embedding, (1, -1)))[0]
+        scores = np.empty(self.rows, dtype=np.float32)
+        # Считаем блоками в float32: float16/int8 на лету расширяются без копии всей матрицы
+        for start in range(0, self.rows, BLOCK_ROWS):
+            block = self.vectors[start:start + BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def most_similar(self, query_embedding):
+        return int(np.argmax(self.scores(query_embedding)))
+
+    def to_float32(self):
+        """Вектора целиком в памяти (для пересборки индекса)"""
+        vectors = np.asarray(self.vectors, dtype=np.float32)
+        if self.scales is not None:
+            vectors = vectors * self.scales[:, None]
+        return vectors
+
+
+def open_store(prefix):
+    """Открывает текущую версию; бросает FileNotFoundError/ValueError, если её нет или она битая"""
+    directory = os.path.dirname(prefix)
+    with open(manifest_path(prefix), encoding='utf-8') as f:
+        manifest = json.load(f)
+    vectors = np.load(os.path.join(directory, manifest['vectors']), mmap_mode='r', allow_pickle=False)
+    scales = None
+    if manifest.get('scales'):
+        scales = np.load(os.path.join(directory, manifest['scales']), allow_pickle=False)
+    if vectors.shape != (manifest['rows'], manifest['dim']) or str(vectors.dtype) != manifest['dtype']:
+        raise ValueError(f"Embedding store {prefix} does not match its manifest")
+    return EmbeddingStore(prefix, manifest, vectors, scales)
+
+def save_store(prefix, embeddings, row_hashes, model_name, dtype=DEFAULT_DTYPE, version=None):
+    """Пишет новую версию хранилища и переключает на неё манифест"""
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported dtype: {dtype}")
+    directory, name = os.path.split(prefix)
+    if version is None:
+        try:
+            with open(manifest_path(prefix), encoding='utf-8') as f:
+                version = json.load(f)['version'] + 1
+        except (OSError, ValueError, KeyError):
+            version = 1
+
+    vectors, scales = quantize(normalize(embeddings), dtype)
+    vectors_name = f'{name}.v{version}.npy'
+    scales_name = f'{name}.v{version}.scale.npy' if scales is not None else None
+    save_npy(os.path.join(directory, vectors_name), vectors)
+    if scales is not None:
+        save_npy(os.path.join(directory, scales_name), scales)
+
+    manifest = {
+        'version': version,
+        'model': model_name,
+        'dtype': dtype,
+        'rows': int(vectors.shape[0]),
+        'dim': int(vectors.shape[1]),
+        'vectors': vectors_name,
+        'scales': scales_name,
+        'row_hashes': list(row_hashes),
+        'built_at': time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+    def write_manifest(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+    atomic_write(manifest_path(prefix), write_manifest)
+
+    # Файлы прежних версий больше не нужны; уже открытые memmap продолжат работать (Linux)
+    keep = {vectors_name, scales_name}
+    for file_name in os.listdir(directory or '.'):
+        if file_name.startswith(f'{name}.v') and file_name.endswith('.npy') and file_name not in keep:
+            os.remove(os.path.join(directory, file_name))
+    return manifest
+
+
+# Перевод существующего question_embeddings.pkl в новый формат без пересчёта векторов
+if __name__ == '__main__':
+    import joblib
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Конвертация question_embeddings.pkl в memmap-хранилище")
+    parser.add_argument('--pickle', default='question_embeddings.pkl')
+    parser.add_argument('--csv', default='База данных - Лист1.csv')
+    parser.add_argument('--prefix', default='question_embeddings')
+    parser.add_argument('--dtype', choices=DTYPES, default=DEFAULT_DTYPE)
+    parser.add_argument('--model', default='all-MiniLM-L12-v2', help="модель, которой посчитан pickle")
+    args = parser.parse_args()
+
+    knowledge_base = pd.read_csv(args.csv).to_dict(orient='records')
+    embeddings = joblib.load(args.pickle)
+    if len(embeddings) != len(knowledge_base):
+        raise SystemExit(f"{args.pickle}: {len(embeddings)} векторов, а в CSV {len(knowledge_base)} строк")
+    manifest = save_store(
+        args.prefix,
+        embeddings,
+        [question_hash(item['Вопрос']) for item in knowledge_base],
+        args.model,
+        args.dtype
+    )
+    print(f"Сохранено: {manifest['vectors']} ({manifest['rows']}x{manifest['dim']}, {manifest['dtype']}), "
+          f"версия {manifest['version']}")
@@ -0,0 +1,99 @@
+import json
+import os
+
+import numpy as np
+
+# Быстрый старт кодировщика вопросов.
+#
+# export_encoder.py выгружает модель SentenceTransformer в каталог encoder/:
+# граф ONNX (model.onnx) или TorchScript (model.pt) с усреднением токенов
+# внутри, tokenizer.json и encoder.json с параметрами. ExportedEncoder
+# поднимает такой каталог без импорта sentence_transformers/transformers:
+# для ONNX нужны только onnxruntime и tokenizers, поэтому старт занимает
+# доли секунды вместо нескольких секунд. load_encoder выбирает
+# выгруженный кодировщик, если он есть, иначе грузит SentenceTransformer.
+
+META_FILE = 'encoder.json'
+
+
+class ExportedEncoder:
+    """Кодировщик из каталога export_encoder.py; интерфейс encode как у SentenceTransformer"""
+
+    def __init__(self, directory, threads=None):
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(directory, META_FILE), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(self.meta['max_length'])
+        self.tokenizer.enable_padding(pad_id=self.meta['pad_id'], pad_token=self.meta['pad_token'])
+
+        path = os.path.join(directory, self.meta['file'])
+        if self.meta['format'] == 'onnx':
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            if threads:
+                options.intra_op_num_threads = threads
+            self._session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+            self._inputs = {item.name for item in self._session.get_inputs()}
+            self._run = self._run_onnx
+        elif self.meta['format'] == 'torchscript':
+            import torch
+
+            if threads:
+                torch.set_num_threads(threads)
+            self._torch = torch
+            self._module = torch.jit.load(path, map_location='cpu').eval()
+            self._run = self._run_torchscript
+        else:
+            raise ValueError(f"Unknown encoder format: {self.meta['format']}")
+
+    def get_sentence_embedding_dimension(self):
+        return self.meta['dim']
+
+    def _tokenize(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        return {
+            'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+            'attention_mask': np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            'token_type_ids': np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+
+    def _run_onnx(self, inputs):
+        feed = {name: value for name, value in inputs.items() if name in self._inputs}
+        return self._session.run(None, feed)[0]
+
+    def _run_torchscript(self, inputs):
+        with self._torch.inference_mode():
+            tensors = [self._torch.from_numpy(inputs[name]) for name in ('input_ids', 'attention_mask', 'token_type_ids')]
+            return self._module(*tensors).numpy()
+
+    def encode(self, sentences, batch_size=32, normalize_embeddings=False, **params):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else [str(text) for text in sentences]
+        # Сортировка по длине — меньше паддинга внутри пачки, как в SentenceTransformer
+        order = np.argsort([-len(text) for text in texts], kind='stable')
+        vectors = np.empty((len(texts), self.meta['dim']), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            vectors[rows] = self._run(self._tokenize([texts[i] for i in rows]))
+        if normalize_embeddings:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors[0] if single else vectors
+
+
+def load_encoder(model_name, encoder_dir='encoder', threads=None):
+    """Выгруженный кодировщик из encoder_dir, если он есть и собран из model_name, иначе SentenceTransformer"""
+    if encoder_dir and os.path.exists(os.path.join(encoder_dir, META_FILE)):
+        try:
+            encoder = ExportedEncoder(encoder_dir, threads)
+        except ImportError as e:
+            print(f"Выгруженный кодировщик недоступен ({e}), загружаем SentenceTransformer")
+        else:
+            if encoder.meta['model'] == model_name:
+                return encoder
+            print(f"Кодировщик в {encoder_dir} собран из {encoder.meta['model']}, а не {model_name}")
+
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
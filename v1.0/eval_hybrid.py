@@ -0,0 +1,63 @@
+import argparse
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from embedding_store import open_store
+from lexical import load_or_build
+from search import BruteForceIndex, HybridIndex
+
+# Сравнение векторного и гибридного (BM25 + вектора, RRF) поиска без модели.
+#
+# Как в calibrate_threshold.py: каждый вопрос базы по очереди считается
+# вопросом пользователя (его вектор берётся из хранилища), точные дубли текста
+# исключаются, и проверяется, совпал ли ответ лучшего из остальных. Отдельно —
+# вопросы с кодами, аббревиатурами и числами, ради которых нужен BM25.
+
+EXACT_TOKEN_RE = re.compile(r"\d|\b[A-ZА-ЯЁ]{2,}\b")
+
+
+def evaluate(index, vectors, questions, question_ids, answer_ids, k, hybrid=False):
+    correct = np.zeros(len(questions), dtype=bool)
+    started = time.perf_counter()
+    for row, question in enumerate(questions):
+        rows, _ = index.search(vectors[row], k, text=question) if hybrid else index.search(vectors[row], k)
+        others = [found for found in rows if question_ids[found] != question_ids[row]]
+        correct[row] = bool(others) and answer_ids[others[0]] == answer_ids[row]
+    return correct, (time.perf_counter() - started) / len(questions) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Векторный поиск против гибридного BM25 + RRF")
+    parser.add_argument('--csv', default='База данных - Лист1.csv')
+    parser.add_argument('--store', default='question_embeddings')
+    parser.add_argument('--lexical-index', default='lexical_index.npz')
+    parser.add_argument('--prefilter', type=int, nargs='+', default=[50, 200, 1000])
+    parser.add_argument('--k', type=int, default=20, help="глубина выдачи, из которой отбрасываются дубли вопроса")
+    args = parser.parse_args()
+
+    knowledge_base = pd.read_csv(args.csv)
+    questions = knowledge_base['Вопрос'].astype(str).tolist()
+    answer_ids = pd.factorize(knowledge_base['Ответ'])[0]
+    question_ids = pd.factorize(knowledge_base['Вопрос'])[0]
+    exact = np.array([bool(EXACT_TOKEN_RE.search(question)) for question in questions])
+    store = open_store(args.store)
+    vectors = store.to_float32()
+    dense = BruteForceIndex(store.vectors, store.scales, in_memory=True)
+    lexical = load_or_build(args.lexical_index, questions)
+
+    print(f"{len(questions)} вопросов, с кодами/аббревиатурами/числами: {exact.sum()}, стеммер {lexical.stemmer}")
+    print(f"{'поиск':<22}{'верно':>8}{'с кодами':>10}{'мс/запрос':>11}")
+    correct, latency = evaluate(dense, vectors, questions, question_ids, answer_ids, args.k)
+    print(f"{'векторный':<22}{correct.mean():>8.1%}{correct[exact].mean():>10.1%}{latency:>11.2f}")
+    for prefilter in args.prefilter:
+        hybrid = HybridIndex(dense, lexical, store.vectors, store.scales, prefilter=prefilter)
+        correct, latency = evaluate(hybrid, vectors, questions, question_ids, answer_ids, args.k, hybrid=True)
+        name = f"гибрид, prefilter {prefilter}"
+        print(f"{name:<22}{correct.mean():>8.1%}{correct[exact].mean():>10.1%}{latency:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
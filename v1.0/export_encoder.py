@@ -0,0 +1,207 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from encoder_runtime import META_FILE, ExportedEncoder
+
+# Выгрузка SentenceTransformer в ONNX или TorchScript для быстрого старта (см. encoder_runtime.py).
+#
+#     python export_encoder.py                      # encoder/model.onnx + encoder/model.int8.onnx
+#     python export_encoder.py --quantize none      # только float32
+#     python export_encoder.py --format torchscript # encoder/model.pt
+#
+# По умолчанию ONNX-граф дополнительно квантуется в int8 (динамическая
+# квантизация весов onnxruntime): файл в ~4 раза меньше, запрос на CPU быстрее.
+# После выгрузки кодировщик сверяется с исходной моделью и с векторами в
+# question_embeddings: если косинус хоть на одном вопросе ниже --min-cosine,
+# encoder.json переименовывается в encoder.rejected.json, бот продолжит
+# работать на SentenceTransformer, а скрипт завершится с кодом 1.
+
+
+def build_module(model):
+    """Трансформер + усреднение токенов по маске (как Pooling mean в SentenceTransformer)"""
+    import torch
+
+    transformer = model[0].auto_model
+
+    class MeanPooledEncoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            hidden = self.transformer(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                token_type_ids=token_type_ids,
+                return_dict=False
+            )[0]
+            mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+            return (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+
+    return MeanPooledEncoder().eval()
+
+
+def write_meta(directory, meta):
+    with open(os.path.join(directory, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+
+def export(model_name, directory, export_format, opset=14):
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device='cpu')
+    pooling = model[1].get_pooling_mode_str()
+    if pooling != 'mean':
+        raise SystemExit(f"Поддерживается только mean pooling, у {model_name} — {pooling}")
+
+    os.makedirs(directory, exist_ok=True)
+    model.tokenizer.save_pretrained(directory)
+    module = build_module(model)
+    sample = model.tokenizer(["Какие документы нужны для поступления?", "Проходной балл"],
+                             padding=True, return_tensors='pt')
+    inputs = (sample['input_ids'], sample['attention_mask'], sample['token_type_ids'])
+
+    if export_format == 'onnx':
+        file_name = 'model.onnx'
+        torch.onnx.export(
+            module, inputs, os.path.join(directory, file_name),
+            input_names=['input_ids', 'attention_mask', 'token_type_ids'],
+            output_names=['embeddings'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'tokens'},
+                'attention_mask': {0: 'batch', 1: 'tokens'},
+                'token_type_ids': {0: 'batch', 1: 'tokens'},
+                'embeddings': {0: 'batch'}
+            },
+            opset_version=opset
+        )
+    else:
+        file_name = 'model.pt'
+        with torch.inference_mode():
+            traced = torch.jit.trace(module, inputs, strict=False)
+        traced.save(os.path.join(directory, file_name))
+
+    meta = {
+        'model': model_name,
+        'format': export_format,
+        'file': file_name,
+        'quantization': None,
+        'dim': model.get_sentence_embedding_dimension(),
+        'max_length': model.max_seq_length,
+        'pad_id': model.tokenizer.pad_token_id,
+        'pad_token': model.tokenizer.pad_token,
+        'exported_at': time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+    write_meta(directory, meta)
+    return model, meta
+
+
+def quantize_int8(directory, meta):
+    """Динамическая int8-квантизация весов ONNX-графа; encoder.json переключается на квантованный файл"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    file_name = 'model.int8.onnx'
+    quantize_dynamic(
+        os.path.join(directory, meta['file']),
+        os.path.join(directory, file_name),
+        weight_type=QuantType.QInt8
+    )
+    meta = dict(meta, file=file_name, quantization='int8')
+    write_meta(directory, meta)
+    return meta
+
+
+def compare(reference, exported, texts):
+    """Минимальное и среднее косинусное сходство векторов выгруженной модели с исходной"""
+    expected = reference.encode(texts, normalize_embeddings=True)
+    actual = exported.encode(texts, normalize_embeddings=True)
+    cosines = np.sum(expected * actual, axis=1)
+    return float(cosines.min()), float(cosines.mean())
+
+
+def compare_store(exported, texts, prefix):
+    """Сверка с векторами в хранилище: (число найденных вопросов, min и mean косинус, доля совпавших top-1)"""
+    from embedding_store import open_store, question_hash
+
+    store = open_store(prefix)
+    stored = store.to_float32()
+    stored /= np.maximum(np.linalg.norm(stored, axis=1, keepdims=True), 1e-12)
+    rows = {row_hash: row for row, row_hash in enumerate(store.row_hashes)}
+    hashes = [question_hash(text) for text in texts]
+    known = [(text, row_hash) for text, row_hash in zip(texts, hashes) if row_hash in rows]
+    if not known:
+        return 0, 1.0, 1.0, 1.0
+    actual = exported.encode([text for text, _ in known], normalize_embeddings=True)
+    expected = stored[[rows[row_hash] for _, row_hash in known]]
+    cosines = np.sum(expected * actual, axis=1)
+    # Повторы вопросов в базе дают одинаковый хэш — сравниваем по хэшу, а не по номеру строки
+    nearest = np.argmax(actual @ stored.T, axis=1)
+    agreement = np.mean([store.row_hashes[row] == row_hash for row, (_, row_hash) in zip(nearest, known)])
+    return len(known), float(cosines.min()), float(cosines.mean()), float(agreement)
+
+
+def latency_ms(model, texts):
+    """Медианное время кодирования одного вопроса, мс"""
+    model.encode(texts[:4])  # прогрев
+    timings = []
+    for text in texts:
+        started = time.perf_counter()
+        model.encode([text])
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка кодировщика вопросов в ONNX/TorchScript")
+    parser.add_argument('--model', default='all-MiniLM-L12-v2')
+    parser.add_argument('--output', default='encoder')
+    parser.add_argument('--format', choices=('onnx', 'torchscript'), default='onnx')
+    parser.add_argument('--quantize', choices=('int8', 'none'), default='int8', help="квантизация ONNX-графа")
+    parser.add_argument('--csv', default='База данных - Лист1.csv', help="вопросы для сверки с исходной моделью")
+    parser.add_argument('--check-rows', type=int, default=500)
+    parser.add_argument('--embeddings', default='question_embeddings', help="хранилище векторов для сверки")
+    parser.add_argument('--min-cosine', type=float, default=0.98,
+                        help="минимально допустимый косинус с исходной моделью и с хранилищем")
+    args = parser.parse_args()
+    if args.quantize != 'none' and args.format != 'onnx':
+        parser.error("--quantize поддерживается только для --format onnx")
+
+    reference, meta = export(args.model, args.output, args.format)
+    if args.quantize == 'int8':
+        meta = quantize_int8(args.output, meta)
+    size = os.path.getsize(os.path.join(args.output, meta['file'])) / 2 ** 20
+    print(f"Кодировщик сохранён в {args.output}/{meta['file']} ({args.format}, {size:.0f} МБ)")
+
+    with open(args.csv, encoding='utf-8', newline='') as f:
+        texts = [row['Вопрос'] for row in csv.DictReader(f)][:args.check_rows]
+    exported = ExportedEncoder(args.output)
+    worst, mean = compare(reference, exported, texts)
+    print(f"Сверка на {len(texts)} вопросах: косинус с исходной моделью min {worst:.5f}, mean {mean:.5f}")
+    passed = worst >= args.min_cosine
+
+    if os.path.exists(args.embeddings + '.meta.json'):
+        found, store_worst, store_mean, agreement = compare_store(exported, texts, args.embeddings)
+        print(f"Сверка с {args.embeddings} ({found} вопросов): косинус min {store_worst:.5f}, "
+              f"mean {store_mean:.5f}, совпадение top-1 {agreement:.1%}")
+        passed = passed and store_worst >= args.min_cosine
+
+    sample = texts[:100]
+    print(f"Один вопрос: SentenceTransformer {latency_ms(reference, sample):.1f} мс, "
+          f"выгруженный {latency_ms(exported, sample):.1f} мс")
+
+    if not passed:
+        os.replace(os.path.join(args.output, META_FILE), os.path.join(args.output, 'encoder.rejected.json'))
+        print(f"Косинус ниже {args.min_cosine}: кодировщик отклонён (encoder.rejected.json), "
+              f"попробуйте --quantize none")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+import argparse
+import csv
+import hashlib
+import io
+import json
+import re
+
+import numpy as np
+
+from embedding_store import atomic_write, question_hash
+
+# Лексический поиск BM25 по вопросам базы.
+#
+# all-MiniLM-L12-v2 обучена в основном на английском и плохо различает
+# точные токены русских вопросов: коды направлений (09.03.01), аббревиатуры
+# (ИВТ, ВУЦ, ВСОШ), числа. BM25 ищет их буквально. Слова приводятся к основе
+# стеммером Snowball (snowballstemmer, необязательная зависимость; без него —
+# первые 6 букв), числа и коды остаются целиком.
+#
+# Индекс инвертированный и хранится компактно в lexical_index.npz: словарь,
+# смещения списков, номера строк (int32) и частоты (uint16) одним массивом.
+# В файле записан отпечаток вопросов базы — если база изменилась,
+# load_or_build пересобирает индекс.
+
+INDEX_VERSION = 1
+_TOKEN_RE = re.compile(r"\d+(?:[.,]\d+)*|[a-zа-я]+")
+_STOPWORDS = frozenset(
+    "и в во на с со по за для а ли не ни что как какие какой какая каком у о об от до из к ко же "
+    "мне меня я мы вы вас нас он она они это ещё еще или но то бы если при про так там тут уже "
+    "можно будет есть нужно здравствуйте подскажите пожалуйста добрый день".split()
+)
+
+
+def _load_stemmer():
+    try:
+        import snowballstemmer  # необязательная зависимость
+    except ImportError:
+        return 'prefix6', lambda words: [word[:6] for word in words]
+    stemmer = snowballstemmer.stemmer('russian')
+    return 'snowball-russian', stemmer.stemWords
+
+
+STEMMER, _stem_words = _load_stemmer()
+
+
+def tokenize(text):
+    """Токены для BM25: числа и коды целиком, слова — основы без стоп-слов"""
+    tokens = _TOKEN_RE.findall(str(text).lower().replace('ё', 'е'))
+    numbers = [token for token in tokens if token[0].isdigit()]
+    words = [token for token in tokens if not token[0].isdigit() and len(token) > 1 and token not in _STOPWORDS]
+    return numbers + _stem_words(words)
+
+
+def corpus_hash(row_hashes):
+    return hashlib.sha1(''.join(row_hashes).encode('ascii')).hexdigest()
+
+
+class BM25Index:
+    """Инвертированный индекс BM25: postings[offsets[t]:offsets[t + 1]] — строки с термом t"""
+
+    def __init__(self, terms, offsets, postings, freqs, doc_lengths, fingerprint, stemmer=STEMMER, k1=1.2, b=0.75):
+        self.terms = terms
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.postings = postings
+        self.freqs = freqs
+        self.doc_lengths = doc_lengths
+        self.fingerprint = fingerprint
+        self.stemmer = stemmer
+        self.k1 = k1
+        self.b = b
+        self.rows = len(doc_lengths)
+        document_freq = np.diff(offsets)
+        self.idf = np.log(1 + (self.rows - document_freq + 0.5) / (document_freq + 0.5)).astype(np.float32)
+        average = doc_lengths.mean() if self.rows else 1
+        self.length_norm = (k1 * (1 - b + b * doc_lengths / max(average, 1))).astype(np.float32)
+
+    @classmethod
+    def build(cls, texts, row_hashes, k1=1.2, b=0.75):
+        postings = {}
+        doc_lengths = np.zeros(len(texts), dtype=np.uint16)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[row] = min(len(tokens), 65535)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                postings.setdefault(token, []).append((row, count))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+        rows = np.empty(offsets[-1], dtype=np.int32)
+        freqs = np.empty(offsets[-1], dtype=np.uint16)
+        for i, term in enumerate(terms):
+            pairs = np.array(postings[term], dtype=np.int64)
+            rows[offsets[i]:offsets[i + 1]] = pairs[:, 0]
+            freqs[offsets[i]:offsets[i + 1]] = np.minimum(pairs[:, 1], 65535)
+        return cls(terms, offsets, rows, freqs, doc_lengths, corpus_hash(row_hashes), STEMMER, k1, b)
+
+    def save(self, file_path):
+        meta = {'version': INDEX_VERSION, 'fingerprint': self.fingerprint, 'stemmer': self.stemmer,
+                'k1': self.k1, 'b': self.b}
+
+        def write(tmp_path):
+            # Через буфер: np.savez сам дописывает .npz к имени без расширения
+            buffer = io.BytesIO()
+            np.savez_compressed(buffer, terms=np.array(self.terms, dtype=str), offsets=self.offsets,
+                                postings=self.postings, freqs=self.freqs, doc_lengths=self.doc_lengths,
+                                meta=np.array(json.dumps(meta)))
+            with open(tmp_path, 'wb') as f:
+                f.write(buffer.getvalue())
+        atomic_write(file_path, write)
+
+    @classmethod
+    def load(cls, file_path):
+        with np.load(file_path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta['version'] != INDEX_VERSION:
+                raise ValueError(f"Unsupported lexical index version: {meta['version']}")
+            return cls(data['terms'].tolist(), data['offsets'], data['postings'], data['freqs'],
+                       data['doc_lengths'], meta['fingerprint'], meta['stemmer'], meta['k1'], meta['b'])
+
+    def scores(self, text):
+        """Оценки BM25 всех строк; строки без общих термов с запросом получают 0"""
+        scores = np.zeros(self.rows, dtype=np.float32)
+        for term in set(tokenize(text)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            rows = self.postings[start:end]
+            freqs = self.freqs[start:end].astype(np.float32)
+            scores[rows] += self.idf[term_id] * freqs * (self.k1 + 1) / (freqs + self.length_norm[rows])
+        return scores
+
+    def search(self, text, k=1):
+        """Не больше k строк с ненулевой оценкой, по убыванию"""
+        scores = self.scores(text)
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        best = matched[np.argsort(-scores[matched], kind='stable')]
+        return best, scores[best]
+
+
+def load_or_build(file_path, questions):
+    """Индекс из файла, если он построен по тем же вопросам и тем же стеммером, иначе строит и сохраняет"""
+    row_hashes = [question_hash(question) for question in questions]
+    try:
+        index = BM25Index.load(file_path)
+    except (OSError, ValueError, KeyError):
+        index = None
+    if index is None or index.fingerprint != corpus_hash(row_hashes) or index.stemmer != STEMMER:
+        index = BM25Index.build(questions, row_hashes)
+        index.save(file_path)
+    return index
+
+
+# Построение индекса по базе и проверочный запрос
+if __name__ == '__main__':
+    import os
+    import time
+
+    parser = argparse.ArgumentParser(description="Построение BM25-индекса по вопросам базы")
+    parser.add_argument('--csv', default='База данных - Лист1.csv')
+    parser.add_argument('--output', default='lexical_index.npz')
+    parser.add_argument('--query', default="Какие документы нужны для поступления на 09.03.01 ИВТ?")
+    args = parser.parse_args()
+
+    with open(args.csv, encoding='utf-8', newline='') as f:
+        knowledge_base = list(csv.DictReader(f))
+    questions = [item['Вопрос'] for item in knowledge_base]
+    started = time.perf_counter()
+    index = BM25Index.build(questions, [question_hash(question) for question in questions])
+    index.save(args.output)
+    print(f"{args.output}: {index.rows} строк, {len(index.terms)} термов, {len(index.postings)} вхождений, "
+          f"{os.path.getsize(args.output) / 1024:.0f} КБ, стеммер {index.stemmer}, "
+          f"{time.perf_counter() - started:.2f} с")
+    print(f"Запрос: {args.query} -> {tokenize(args.query)}")
+    rows, scores = index.search(args.query, 5)
+    for row, score in zip(rows, scores):
+        print(f"  {score:6.2f}  {questions[row]}")
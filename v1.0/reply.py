@@ -1,55 +1,121 @@
-import pandas as pd
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
-import joblib
-import os
+import csv
+from embedding_store import open_store, question_hash
+from encoder_runtime import load_encoder
+from lexical import load_or_build as load_lexical_index
+from search import HybridIndex, make_index
 
-# Загрузка предобученной модели для получения векторов предложений
-model = SentenceTransformer('all-MiniLM-L12-v2')
+# Модель, база знаний и вектора загружаются при первом обращении (get_model и т.д.),
+# поэтому импорт модуля ничего тяжёлого не делает. Конфигурация и поиск здесь общие с bot.py
+MODEL_NAME = 'all-MiniLM-L12-v2'
+KNOWLEDGE_BASE_PATH = 'База данных - Лист1.csv'
+# Префикс файлов хранилища векторов (см. embedding_store.py)
+EMBEDDINGS_PREFIX = 'question_embeddings'
+# Каталог выгруженного кодировщика (export_encoder.py): быстрый старт без torch; если его нет — SentenceTransformer
+ENCODER_DIR = 'encoder'
 
-# Загружаем данные из CSV-файла
+# Поиск похожего вопроса (search.py): 'brute' — точный перебор, 'ivf'/'hnsw' — приближённый для больших баз.
+# Параметры точности/скорости: ivf — n_lists, n_probe; hnsw — m, ef; brute — in_memory
+SEARCH_BACKEND = 'brute'
+SEARCH_PARAMS = {}
+# Гибридный поиск: BM25 по вопросам базы (lexical.py) как предфильтр + вектора, объединение RRF.
+# Находит точные коды направлений, аббревиатуры и числа, которые плохо различает модель.
+# Параметры — prefilter, min_candidates, depth, rrf_k (см. HybridIndex в search.py)
+HYBRID_SEARCH = True
+HYBRID_PARAMS = {}
+LEXICAL_INDEX_PATH = 'lexical_index.npz'
+
+# Ответ выдаётся, только если сходство с вопросом из базы не ниже порога (подбор — calibrate_threshold.py)
+SIMILARITY_THRESHOLD = 0.8
+TOP_K = 3
+
+_model = None
+_knowledge_base = None
+_search_index = None
+
+# Загружаем данные из CSV-файла (модуль csv вместо pandas — без секунды на импорт)
 def load_knowledge_base(file_path):
-    # Загружаем данные в pandas DataFrame
-    df = pd.read_csv(file_path)
-    # Преобразуем данные в формат списка словарей
-    knowledge_base = df.to_dict(orient='records')
-    return knowledge_base
+    with open(file_path, encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
 
 # Функция для загрузки предвычисленных векторов вопросов
-def load_question_embeddings(file_path):
-    return joblib.load(file_path)
+def load_question_embeddings(prefix, knowledge_base):
+    # Вектора открываются через memmap: процесс не копирует их в память, страницы общие для всех процессов
+    question_embeddings = open_store(prefix)
+    if question_embeddings.row_hashes != [question_hash(item['Вопрос']) for item in knowledge_base]:
+        raise ValueError("Вектора не соответствуют базе знаний, пересоберите их: python vectors.py")
+    search_index = make_index(question_embeddings, SEARCH_BACKEND, **SEARCH_PARAMS)
+    if HYBRID_SEARCH:
+        lexical_index = load_lexical_index(LEXICAL_INDEX_PATH, [item['Вопрос'] for item in knowledge_base])
+        search_index = HybridIndex(search_index, lexical_index, question_embeddings.vectors,
+                                   question_embeddings.scales, **HYBRID_PARAMS)
+    return search_index
 
-# Функция для поиска наиболее схожего вопроса и получения ответа
-def get_answer(user_question, knowledge_base, question_embeddings):
-    # Преобразуем запрос пользователя в вектор
-    user_embedding = model.encode([user_question])
+def get_model():
+    global _model
+    if _model is None:
+        _model = load_encoder(MODEL_NAME, ENCODER_DIR)
+    return _model
 
-    # Вычисляем косинусное сходство между запросом и вопросами в базе знаний
-    similarities = cosine_similarity(user_embedding, question_embeddings)
+def get_knowledge_base():
+    global _knowledge_base
+    if _knowledge_base is None:
+        _knowledge_base = load_knowledge_base(KNOWLEDGE_BASE_PATH)
+    return _knowledge_base
 
-    # Находим индекс самого похожего вопроса
-    most_similar_index = np.argmax(similarities)
+def get_search_index():
+    global _search_index
+    if _search_index is None:
+        _search_index = load_question_embeddings(EMBEDDINGS_PREFIX, get_knowledge_base())
+    return _search_index
 
-    # Возвращаем ответ, соответствующий наиболее похожему вопросу
-    return knowledge_base[most_similar_index]['Ответ']
+# Кандидаты [(ответ, сходство)] по уже посчитанному вектору вопроса; одинаковые ответы схлопываются в один
+def rank_answers(user_embedding, knowledge_base, search_index, k=TOP_K, user_question=None):
+    # Берём с запасом: у многих вопросов базы один и тот же ответ
+    params = {'text': user_question} if isinstance(search_index, HybridIndex) else {}
+    indices, scores = search_index.search(user_embedding, k * 5, **params)
+    candidates = []
+    seen = set()
+    for index, score in zip(indices, scores):
+        answer = knowledge_base[index]['Ответ']
+        if answer not in seen:
+            seen.add(answer)
+            candidates.append((answer, float(score)))
+    return candidates[:k]
 
-# Основная логика для получения ответа
-def ask_question():
-    # Загрузка базы знаний
-    knowledge_base = load_knowledge_base('База данных - Лист1.csv')
+# Кандидаты [(ответ, сходство)] по убыванию релевантности
+def find_answers(user_question, knowledge_base, search_index, k=TOP_K):
+    user_embedding = get_model().encode(user_question)
+    return rank_answers(user_embedding, knowledge_base, search_index, k, user_question)
+
+# Ответ None, если даже самый похожий вопрос базы ниже порога уверенности
+def pick_answer(candidates):
+    if not candidates or candidates[0][1] < SIMILARITY_THRESHOLD:
+        return None, candidates
+    return candidates[0][0], candidates
 
-    # Файл для сохранения векторов вопросов
-    embeddings_file = 'question_embeddings.pkl'
+# Функция для поиска наиболее схожего вопроса и получения ответа
+def get_answer(user_question, knowledge_base=None, search_index=None):
+    knowledge_base = knowledge_base or get_knowledge_base()
+    search_index = search_index or get_search_index()
+    return pick_answer(find_answers(user_question, knowledge_base, search_index))
 
-    # Загружаем предвычисленные вектора вопросов
+# Основная логика для получения ответа
+def ask_question():
+    # Загружаем базу знаний, предвычисленные вектора вопросов и модель
     print("Загружаем предвычисленные вектора вопросов...")
-    question_embeddings = load_question_embeddings(embeddings_file)
+    get_search_index()
+    get_model()
 
     # Запрос от пользователя
     user_question = input("Задайте вопрос: ")
-    answer = get_answer(user_question, knowledge_base, question_embeddings)
+    answer, candidates = get_answer(user_question)
+    if answer is None:
+        print("Уверенного ответа нет, ближайшие варианты:")
+        for candidate, score in candidates:
+            print(f"[{score:.2f}] {candidate}")
+        return
     print(f"Ответ: {answer}")
 
 # Запуск процесса получения ответа на вопрос
-ask_question()
\ No newline at end of file
+if __name__ == '__main__':
+    ask_question()
@@ -0,0 +1,202 @@
+import numpy as np
+
+# Поиск ближайших вопросов по нормированным векторам хранилища (embedding_store.py).
+#
+# brute — точный перебор: скалярное произведение со всей матрицей, O(N·d).
+# ivf   — инвертированные списки: вектора разбиты k-means на n_lists групп,
+#         запрос сравнивается с центрами и перебираются только n_probe
+#         ближайших групп. Больше n_probe — выше точность, ниже скорость.
+# hnsw  — граф HNSW из библиотеки hnswlib (необязательная зависимость),
+#         точность/скорость задаёт ef.
+#
+# HybridIndex добавляет к любому из них лексический BM25 (lexical.py): ранги
+# двух поисков объединяются через reciprocal rank fusion, а при достаточном
+# числе лексических совпадений вектора сравниваются только с ними.
+
+BACKENDS = ('brute', 'ivf', 'hnsw')
+BLOCK_ROWS = 65536
+# До стольких строк brute по умолчанию держит float32-копию в памяти (при d=384 это до ~77 МБ)
+IN_MEMORY_MAX_ROWS = 50000
+
+
+def top_k(scores, k):
+    """Индексы k наибольших значений по убыванию (argpartition вместо полной сортировки)"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def normalize_query(query):
+    query = np.asarray(query, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(query)
+    return query / norm if norm else query
+
+
+def block_scores(vectors, scales, query, rows=None):
+    """Скалярные произведения query со строками vectors (или с их подмножеством rows)"""
+    if vectors.dtype == np.float32 and scales is None:
+        return vectors[rows] @ query if rows is not None else vectors @ query
+    if rows is not None:
+        scores = vectors[rows].astype(np.float32) @ query
+        return scores * scales[rows] if scales is not None else scores
+    scores = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), BLOCK_ROWS):
+        block = vectors[start:start + BLOCK_ROWS]
+        scores[start:start + len(block)] = block.astype(np.float32) @ query
+    return scores * scales if scales is not None else scores
+
+
+class BruteForceIndex:
+    """Точный поиск перебором.
+
+    float16/int8 из memmap расширяются до float32 на каждом запросе — это
+    экономит память, но стоит времени. in_memory=True один раз разворачивает
+    матрицу в float32 в памяти процесса: быстрее на порядок, но RSS растёт на N·d·4 байт.
+    По умолчанию (None) копия делается для баз до IN_MEMORY_MAX_ROWS строк.
+    """
+
+    def __init__(self, vectors, scales=None, in_memory=None):
+        if in_memory is None:
+            in_memory = len(vectors) <= IN_MEMORY_MAX_ROWS
+        if in_memory:
+            vectors = np.asarray(vectors, dtype=np.float32)
+            if scales is not None:
+                vectors = vectors * scales[:, None]
+                scales = None
+        self.vectors = vectors
+        self.scales = scales
+
+    def search(self, query, k=1):
+        scores = block_scores(self.vectors, self.scales, normalize_query(query))
+        best = top_k(scores, k)
+        return best, scores[best]
+
+
+class IVFIndex:
+    """Приближённый поиск по инвертированным спискам (сферический k-means на NumPy)"""
+
+    def __init__(self, vectors, scales=None, n_lists=None, n_probe=8, train_per_list=40, iterations=10, seed=0):
+        self.vectors = vectors
+        self.scales = scales
+        self.n_probe = n_probe
+        rows = len(vectors)
+        self.n_lists = min(rows, n_lists or max(1, int(np.sqrt(rows))))
+
+        # Центры учим на случайной выборке, затем раскладываем по ним все строки
+        rng = np.random.default_rng(seed)
+        sample_size = min(rows, max(train_per_list * self.n_lists, self.n_lists))
+        sample = self._dequantize(np.sort(rng.choice(rows, sample_size, replace=False)))
+        self.centroids = sample[rng.choice(len(sample), self.n_lists, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ self.centroids.T, axis=1)
+            order = np.argsort(assignment, kind='stable')
+            counts = np.bincount(assignment, minlength=self.n_lists)
+            filled = counts > 0
+            starts = (np.cumsum(counts) - counts)[filled]
+            sums = np.add.reduceat(sample[order], starts, axis=0)
+            self.centroids[filled] = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+        assignment = np.empty(rows, dtype=np.int32)
+        for start in range(0, rows, BLOCK_ROWS):
+            block = self._dequantize(np.arange(start, min(rows, start + BLOCK_ROWS)))
+            assignment[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        order = np.argsort(assignment, kind='stable')
+        bounds = np.searchsorted(assignment[order], np.arange(self.n_lists + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(self.n_lists)]
+
+    def _dequantize(self, rows):
+        block = self.vectors[rows].astype(np.float32)
+        return block * self.scales[rows, None] if self.scales is not None else block
+
+    def search(self, query, k=1, n_probe=None):
+        query = normalize_query(query)
+        probes = top_k(self.centroids @ query, n_probe or self.n_probe)
+        rows = np.concatenate([self.lists[list_id] for list_id in probes])
+        rows.sort()  # строки по порядку — последовательное чтение memmap
+        scores = block_scores(self.vectors, self.scales, query, rows)
+        best = top_k(scores, k)
+        return rows[best], scores[best]
+
+
+class HNSWIndex:
+    """Приближённый поиск по графу HNSW (pip install hnswlib)"""
+
+    def __init__(self, vectors, scales=None, m=16, ef_construction=200, ef=64, threads=-1):
+        import hnswlib  # необязательная зависимость
+
+        self.index = hnswlib.Index(space='ip', dim=vectors.shape[1])
+        self.index.init_index(max_elements=len(vectors), M=m, ef_construction=ef_construction)
+        for start in range(0, len(vectors), BLOCK_ROWS):
+            block = vectors[start:start + BLOCK_ROWS].astype(np.float32)
+            if scales is not None:
+                block *= scales[start:start + len(block), None]
+            self.index.add_items(block, np.arange(start, start + len(block)), num_threads=threads)
+        self.index.set_ef(ef)
+
+    def search(self, query, k=1, ef=None):
+        if ef is not None:
+            self.index.set_ef(max(ef, k))
+        labels, distances = self.index.knn_query(normalize_query(query), k=k)
+        # для space='ip' hnswlib возвращает 1 - скалярное произведение
+        return labels[0].astype(np.int64), 1 - distances[0]
+
+
+class HybridIndex:
+    """Гибридный поиск: BM25 как предфильтр + векторы, ранги объединяются RRF.
+
+    Кандидаты — prefilter лучших строк BM25. Если их меньше min_candidates
+    (в вопросе мало слов из базы), к ним добавляются depth строк векторного
+    индекса dense. Для всех кандидатов точно считается косинус, и они
+    упорядочиваются по сумме 1 / (rrf_k + ранг) в двух списках. Возвращаются
+    строки в этом порядке и их косинус, чтобы порог уверенности бота
+    по-прежнему сравнивался со сходством векторов.
+    """
+
+    def __init__(self, dense, lexical, vectors, scales=None, prefilter=200, min_candidates=20, depth=50, rrf_k=60):
+        self.dense = dense
+        self.lexical = lexical
+        self.vectors = vectors
+        self.scales = scales
+        self.prefilter = prefilter
+        self.min_candidates = min_candidates
+        self.depth = depth
+        self.rrf_k = rrf_k
+
+    def search(self, query, k=1, text=None):
+        if text is None:
+            return self.dense.search(query, k)
+        query = normalize_query(query)
+        lexical_rows, _ = self.lexical.search(text, self.prefilter)
+        rows = lexical_rows
+        if len(lexical_rows) < max(self.min_candidates, k):
+            dense_rows, _ = self.dense.search(query, self.depth)
+            rows = np.union1d(lexical_rows, dense_rows)
+        if not len(rows):
+            return rows.astype(np.int64), np.empty(0, dtype=np.float32)
+        rows = np.sort(rows)  # последовательное чтение memmap
+        scores = block_scores(self.vectors, self.scales, query, rows)
+
+        fused = np.zeros(len(rows), dtype=np.float64)
+        dense_rank = np.empty(len(rows), dtype=np.int64)
+        dense_rank[np.argsort(-scores, kind='stable')] = np.arange(len(rows))
+        fused += 1 / (self.rrf_k + 1 + dense_rank)
+        positions = np.searchsorted(rows, lexical_rows)
+        fused[positions] += 1 / (self.rrf_k + 1 + np.arange(len(lexical_rows)))
+        best = top_k(fused, k)
+        return rows[best].astype(np.int64), scores[best]
+
+
+def make_index(store, backend='brute', **params):
+    """Индекс поиска поверх открытого хранилища векторов"""
+    if backend == 'brute':
+        return BruteForceIndex(store.vectors, store.scales, **params)
+    if backend == 'ivf':
+        return IVFIndex(store.vectors, store.scales, **params)
+    if backend == 'hnsw':
+        return HNSWIndex(store.vectors, store.scales, **params)
+    raise ValueError(f"Unknown search backend: {backend}")
@@ -1,37 +1,98 @@
-import pandas as pd
-from sentence_transformers import SentenceTransformer
-import joblib
-import os
+import csv
+import numpy as np
+import argparse
+import time
+from embedding_store import DEFAULT_DTYPE, DTYPES, open_store, question_hash, save_store
 
-# Загрузка предобученной модели для получения векторов предложений
-model = SentenceTransformer('all-MiniLM-L12-v2')
+# Модель для получения векторов предложений; загружается, только если есть что кодировать
+MODEL_NAME = 'all-MiniLM-L12-v2'
+_model = None
+
+def get_model():
+    global _model
+    if _model is None:
+        from sentence_transformers import SentenceTransformer
+        _model = SentenceTransformer(MODEL_NAME)
+    return _model
+
+# Размер пачки для model.encode; на CPU для MiniLM выгоднее 64-128, чем 32 по умолчанию
+DEFAULT_BATCH_SIZE = 64
 
 # Загружаем данные из CSV-файла
 def load_knowledge_base(file_path):
-    # Загружаем данные в pandas DataFrame
-    df = pd.read_csv(file_path)
-    # Преобразуем данные в формат списка словарей
-    knowledge_base = df.to_dict(orient='records')
-    return knowledge_base
+    with open(file_path, encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+# Вектора прошлой версии по хэшам вопросов; пусто, если её нет или она посчитана другой моделью
+def load_previous_vectors(prefix):
+    try:
+        store = open_store(prefix)
+    except (OSError, ValueError, KeyError):
+        return 0, {}
+    if store.manifest['model'] != MODEL_NAME:
+        return store.manifest['version'], {}
+    return store.manifest['version'], dict(zip(store.row_hashes, store.to_float32()))
 
 # Функция для сохранения векторов вопросов
-def save_question_embeddings(knowledge_base, file_path):
+def save_question_embeddings(knowledge_base, prefix, batch_size=DEFAULT_BATCH_SIZE, incremental=True,
+                             dtype=DEFAULT_DTYPE):
+    started = time.perf_counter()
     questions = [item['Вопрос'] for item in knowledge_base]
-    question_embeddings = model.encode(questions)
-    joblib.dump(question_embeddings, file_path)
+    hashes = [question_hash(question) for question in questions]
+
+    version, known = load_previous_vectors(prefix)
+    if not incremental:
+        known = {}
+
+    # Кодируем только новые и изменённые вопросы (повторы — один раз)
+    missing = {}
+    for question, row_hash in zip(questions, hashes):
+        if row_hash not in known:
+            missing.setdefault(row_hash, question)
+    if missing:
+        vectors = get_model().encode(list(missing.values()), batch_size=batch_size)
+        known.update(zip(missing.keys(), vectors))
+
+    question_embeddings = np.stack([known[row_hash] for row_hash in hashes])
+    manifest = save_store(
+        prefix,
+        question_embeddings,
+        hashes,
+        MODEL_NAME,
+        dtype,
+        version + 1
+    )
+
+    reused = len(questions) - sum(1 for row_hash in hashes if row_hash in missing)
+    return {
+        'version': manifest['version'],
+        'file': manifest['vectors'],
+        'rows': len(questions),
+        'reused': reused,
+        'encoded': len(missing),
+        'seconds': time.perf_counter() - started
+    }
 
 # Основная логика для сохранения векторов
-def compute_and_save_embeddings():
+def compute_and_save_embeddings(batch_size=DEFAULT_BATCH_SIZE, incremental=True, dtype=DEFAULT_DTYPE):
     # Загрузка базы знаний
     knowledge_base = load_knowledge_base('База данных - Лист1.csv')
 
-    # Файл для сохранения векторов вопросов
-    embeddings_file = 'question_embeddings.pkl'
+    # Префикс файлов хранилища векторов (question_embeddings.meta.json и question_embeddings.vN.npy)
+    embeddings_prefix = 'question_embeddings'
 
     # Вычисляем и сохраняем вектора вопросов
     print("Вычисляем и сохраняем вектора вопросов...")
-    save_question_embeddings(knowledge_base, embeddings_file)
-    print(f"Вектора сохранены в файл: {embeddings_file}")
+    report = save_question_embeddings(knowledge_base, embeddings_prefix, batch_size, incremental, dtype)
+    print(f"Вектора сохранены в файл: {report['file']} (версия {report['version']})")
+    print(f"Строк: {report['rows']}, взято из прошлой версии: {report['reused']}, "
+          f"закодировано: {report['encoded']}, время: {report['seconds']:.1f} с")
 
 # Запуск процесса сохранения векторов
-compute_and_save_embeddings()
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Построение векторов вопросов базы знаний")
+    parser.add_argument('--full', action='store_true', help="пересчитать все вектора, не используя прошлую версию")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--dtype', choices=DTYPES, default=DEFAULT_DTYPE, help="тип хранения векторов")
+    args = parser.parse_args()
+    compute_and_save_embeddings(args.batch_size, incremental=not args.full, dtype=args.dtype)
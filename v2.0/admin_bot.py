@@ -2,17 +2,25 @@ from aiogram import Bot, Dispatcher, types
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from aiogram.utils import executor
 from aiogram.dispatcher.filters import Command
-import sqlite3
-import csv
+import asyncio
 import os
+import shutil
+import sqlite3
+import tempfile
+import time
 from contextlib import closing
 from dotenv import load_dotenv
 import logging
 from datetime import datetime
+import stats
+from exports import (Export, ExportFilter, FEEDBACK_EXPORT, FEEDBACK_TYPES, FORMATS, QUESTIONS_EXPORT,
+                     export_filtered, export_incremental)
 
 # Загрузка .env
 load_dotenv()
 BOT_TOKEN = os.getenv("ADMIN_BOT_TOKEN")
+# 1 — отбросить команды, пришедшие, пока бот был остановлен
+SKIP_UPDATES = bool(int(os.getenv("SKIP_UPDATES", 0)))
 
 # Список разрешенных ID администраторов
 ADMIN_IDS = []  # Замените эти значения на реальные ID администраторов
@@ -30,58 +38,53 @@ admin_keyboard.add(
     KeyboardButton("📤 Выгрузить вопросы")
 )
 
-# Путь к базам и CSV-файлам
-FEEDBACK_DB = "feedback_log.db"
-QUESTIONS_DB = "questions_log.db"
-FEEDBACK_CSV = "feedback_history.csv"
-QUESTIONS_CSV = "questions_history.csv"
+# Путь к базе бота; CSV-файлы выгрузок — в exports.py
+DB_PATH = os.getenv("DATABASE_PATH", "bot.db")
 
 # Проверка прав доступа
 def is_admin(user_id: int) -> bool:
     return user_id in ADMIN_IDS
 
-def merge_with_existing_csv(db_path: str, csv_path: str, headers: list, query: str):
-    """Объединяет данные из БД с существующим CSV-файлом"""
-    try:
-        # Читаем существующие данные из CSV
-        existing_data = []
-        if os.path.exists(csv_path):
-            with open(csv_path, "r", encoding="utf-8-sig") as f:
-                reader = csv.DictReader(f, delimiter=";")
-                existing_data = [row for row in reader]
-
-        # Получаем новые данные из БД
-        with closing(sqlite3.connect(db_path)) as conn:
-            cursor = conn.execute(query)
-            new_data = cursor.fetchall()
-
-        # Объединяем данные
-        merged_data = existing_data + [
-            dict(zip(headers, row)) for row in new_data
-        ]
-
-        # Удаляем дубликаты по ID
-        seen_ids = set()
-        unique_data = []
-        for row in merged_data:
-            if row["id"] not in seen_ids:
-                seen_ids.add(row["id"])
-                unique_data.append(row)
-
-        # Сортируем по timestamp (если есть в данных)
-        if "timestamp" in headers:
-            unique_data.sort(key=lambda x: x["timestamp"], reverse=True)
-
-        # Записываем обратно в CSV
-        with open(csv_path, "w", encoding="utf-8-sig", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=headers, delimiter=";")
-            writer.writeheader()
-            writer.writerows(unique_data)
-
-        return csv_path
-    except Exception as e:
-        logging.error(f"Error merging CSV: {e}")
-        raise
+# Одна выгрузка файла за раз: повторное нажатие ждёт текущую, а не пишет в CSV параллельно
+export_locks = {}
+
+async def run_export(export: Export) -> str:
+    """Дописывает новые строки в CSV в отдельном потоке, не блокируя бота"""
+    lock = export_locks.setdefault(export.csv_path, asyncio.Lock())
+    async with lock:
+        await asyncio.get_running_loop().run_in_executor(None, export_incremental, DB_PATH, export)
+    return export.csv_path
+
+# Выгрузка с фильтрами: /export feedback from=2025-06-01 to=2025-06-30 type=dislike format=parquet
+EXPORT_SOURCES = {"feedback": FEEDBACK_EXPORT, "questions": QUESTIONS_EXPORT}
+EXPORT_USAGE = ("Формат: /export feedback|questions [from=ГГГГ-ММ-ДД] [to=ГГГГ-ММ-ДД] "
+                "[type=like|dislike] [format=csv|parquet]")
+
+def parse_export_args(args: str):
+    """Разбирает аргументы /export; при ошибке — ValueError с текстом для админа"""
+    words = args.split()
+    if not words or words[0] not in EXPORT_SOURCES:
+        raise ValueError(EXPORT_USAGE)
+    export = EXPORT_SOURCES[words[0]]
+    options = {}
+    for word in words[1:]:
+        key, sep, value = word.partition("=")
+        if not sep or key not in ("from", "to", "type", "format"):
+            raise ValueError(EXPORT_USAGE)
+        options[key] = value
+    for key in ("from", "to"):
+        if key in options:
+            try:
+                datetime.strptime(options[key], "%Y-%m-%d")
+            except ValueError:
+                raise ValueError(f"Дата {options[key]} не в формате ГГГГ-ММ-ДД")
+    if "type" in options and (options["type"] not in FEEDBACK_TYPES or "feedback" not in export.columns):
+        raise ValueError("type=like|dislike есть только у выгрузки feedback")
+    fmt = options.get("format", "csv")
+    if fmt not in FORMATS:
+        raise ValueError(EXPORT_USAGE)
+    export_filter = ExportFilter(options.get("from"), options.get("to"), FEEDBACK_TYPES.get(options.get("type")))
+    return export, export_filter, fmt
 
 # Команда старта
 @dp.message_handler(commands=["start"])
@@ -100,13 +103,8 @@ async def send_feedback_csv(message: types.Message):
         return
     
     try:
-        # Объединяем данные
-        csv_path = merge_with_existing_csv(
-            db_path=FEEDBACK_DB,
-            csv_path=FEEDBACK_CSV,
-            headers=["id", "message_id", "question_text", "bot_answer", "feedback", "user_id", "timestamp"],
-            query="SELECT id, message_id, question_text, bot_answer, feedback, user_id, timestamp FROM feedbacks"
-        )
+        # Дописываем новые строки
+        csv_path = await run_export(FEEDBACK_EXPORT)
 
         # Отправляем файл
         await message.answer_document(types.InputFile(csv_path))
@@ -120,29 +118,61 @@ async def send_questions_csv(message: types.Message):
         return
     
     try:
-        # Объединяем данные
-        csv_path = merge_with_existing_csv(
-            db_path=QUESTIONS_DB,
-            csv_path=QUESTIONS_CSV,
-            headers=["id", "question", "timestamp"],
-            query="SELECT id, question, timestamp FROM questions_log"
-        )
+        # Дописываем новые строки
+        csv_path = await run_export(QUESTIONS_EXPORT)
 
         # Отправляем файл
         await message.answer_document(types.InputFile(csv_path))
     except Exception as e:
         await message.reply(f"Ошибка при экспорте questions: {e}")
 
+@dp.message_handler(commands=["export"])
+async def export_handler(message: types.Message):
+    if not is_admin(message.from_user.id):
+        await message.answer("⛔ Доступ запрещен")
+        return
+
+    try:
+        export, export_filter, fmt = parse_export_args(message.get_args() or "")
+    except ValueError as e:
+        await message.reply(str(e))
+        return
+
+    directory = tempfile.mkdtemp(prefix="export_")
+    try:
+        # Файлы пишутся в отдельном потоке; большие выгрузки приходят несколькими частями
+        paths = await asyncio.get_running_loop().run_in_executor(
+            None, export_filtered, DB_PATH, export, directory, export_filter, fmt
+        )
+        if not paths:
+            await message.reply("Нет строк под заданные условия")
+            return
+        for path in paths:
+            await message.answer_document(types.InputFile(path))
+    except Exception as e:
+        await message.reply(f"Ошибка при экспорте: {e}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def build_stats_report() -> str:
+    with closing(sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)) as conn:
+        return stats.report(conn)
+
+@dp.message_handler(commands=["stats"])
+async def stats_handler(message: types.Message):
+    if not is_admin(message.from_user.id):
+        await message.answer("⛔ Доступ запрещен")
+        return
+
+    try:
+        # Читаются только агрегатные таблицы stats_*, не questions и feedbacks
+        started = time.perf_counter()
+        text = await asyncio.get_running_loop().run_in_executor(None, build_stats_report)
+        logging.info(f"/stats built in {(time.perf_counter() - started) * 1000:.1f} ms")
+        await message.answer(text)
+    except Exception as e:
+        await message.reply(f"Ошибка при сборе статистики: {e}")
+
 if __name__ == "__main__":
-    # Создаем CSV-файлы при первом запуске, если их нет
-    if not os.path.exists(FEEDBACK_CSV):
-        with open(FEEDBACK_CSV, "w", encoding="utf-8-sig", newline="") as f:
-            writer = csv.writer(f, delimiter=";")
-            writer.writerow(["id", "message_id", "question_text", "bot_answer", "feedback", "user_id", "timestamp"])
-
-    if not os.path.exists(QUESTIONS_CSV):
-        with open(QUESTIONS_CSV, "w", encoding="utf-8-sig", newline="") as f:
-            writer = csv.writer(f, delimiter=";")
-            writer.writerow(["id", "question", "timestamp"])
-
-    executor.start_polling(dp, skip_updates=True)
+    # CSV-файлы с заголовком создаются при первой выгрузке
+    executor.start_polling(dp, skip_updates=SKIP_UPDATES)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+ADMIN_STATUSES = ("creator", "administrator")
+
+
+class ChatAdminCache:
+    """Кэш администраторов чатов.
+
+    Проверка is_admin — синхронный поиск в множестве, без запросов к Telegram.
+    Список обновляется целиком фоном (refresh по расписанию или при
+    устаревании старше ttl) и точечно — по апдейтам chat_member.
+    """
+
+    def __init__(self, bot, ttl: float = 600):
+        self.bot = bot
+        self.ttl = ttl
+        self._admins = {}
+        self._loaded_at = {}
+        self._refreshing = {}
+
+    async def refresh(self, chat_id: int):
+        """Загружает актуальный список администраторов чата"""
+        try:
+            admins = await self.bot.get_chat_administrators(chat_id)
+        except Exception as e:
+            logger.error(f"Admin list refresh error: {e}")
+            return
+        self._admins[chat_id] = {admin.user.id for admin in admins}
+        self._loaded_at[chat_id] = time.monotonic()
+        logger.info(f"Admin list for chat {chat_id} refreshed: {len(self._admins[chat_id])} admins")
+
+    def _refresh_in_background(self, chat_id: int):
+        task = self._refreshing.get(chat_id)
+        if task is None or task.done():
+            self._refreshing[chat_id] = asyncio.ensure_future(self.refresh(chat_id))
+
+    def is_admin(self, chat_id: int, user_id: int) -> bool:
+        """Проверка по кэшу; устаревший список обновляется фоном, без ожидания"""
+        loaded_at = self._loaded_at.get(chat_id)
+        if loaded_at is None or time.monotonic() - loaded_at > self.ttl:
+            self._refresh_in_background(chat_id)
+        return user_id in self._admins.get(chat_id, ())
+
+    def apply_member_update(self, chat_id: int, user_id: int, status: str):
+        """Учитывает изменение статуса участника из апдейта chat_member"""
+        admins = self._admins.setdefault(chat_id, set())
+        if status in ADMIN_STATUSES:
+            admins.add(user_id)
+        else:
+            admins.discard(user_id)
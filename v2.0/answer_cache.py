@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import logging
+import math
+import re
+import time
+from collections import OrderedDict, Counter
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_PUNCT_RE = re.compile(r"[^\w\s.]+")
+_SPACES_RE = re.compile(r"\s+")
+# Приветствия и вежливые вставки в начале вопроса не влияют на ответ
+_GREETING_RE = re.compile(
+    r"^(?:(?:здравствуйте|добрый (?:день|вечер)|доброе утро|привет|подскажите|пожалуйста)\s*)+"
+)
+# Токены, которые должны совпадать дословно: коды направлений, числа, аббревиатуры (ИВТ, ВУЦ)
+_KEY_TOKEN_RE = re.compile(r"\b(?:\d[\d.]*|[A-ZА-ЯЁ]{2,})\b")
+
+
+def normalize_question(text: str) -> str:
+    """Приводит вопрос к каноническому виду для точного совпадения"""
+    text = text.lower().replace("ё", "е")
+    text = _PUNCT_RE.sub(" ", text)
+    text = text.replace(". ", " ").rstrip(".")
+    text = _SPACES_RE.sub(" ", text).strip()
+    return _GREETING_RE.sub("", text) or text
+
+
+def key_tokens(text: str) -> frozenset:
+    return frozenset(t.lower() for t in _KEY_TOKEN_RE.findall(text.replace("ё", "е").replace("Ё", "Е")))
+
+
+def trigram_vector(normalized: str) -> dict:
+    """Нормированный вектор символьных триграмм (разреженный, без внешних зависимостей)"""
+    counts = Counter()
+    for word in normalized.split():
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            counts[padded[i:i + 3]] += 1
+    norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+    return {k: v / norm for k, v in counts.items()}
+
+
+def cosine(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class _Entry:
+    __slots__ = ("answer", "vector", "keys", "created_at", "prompt_version")
+
+    def __init__(self, answer: str, vector: dict, keys: frozenset, created_at: float, prompt_version):
+        self.answer = answer
+        self.vector = vector
+        self.keys = keys
+        self.created_at = created_at
+        self.prompt_version = prompt_version
+
+
+class AnswerCache:
+    """Кэш ответов YandexGPT перед get_answer.
+
+    Сначала ищется точное совпадение нормализованного текста, затем ближайший
+    по косинусу вопрос (порог similarity_threshold). Записи живут ttl секунд,
+    при переполнении вытесняются по LRU. Каждый ответ помечен версией
+    промпта, которым он получен: отдаются только ответы текущей версии,
+    а при смене промпта старые записи удаляются (invalidate).
+    """
+
+    def __init__(self, max_size: int = 500, ttl: float = 6 * 3600,
+                 similarity_threshold: float = 0.85,
+                 embedder: Callable[[str], dict] = trigram_vector):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.embedder = embedder
+        self.hits_exact = 0
+        self.hits_similar = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+    def invalidate(self, prompt_version):
+        """Удаляет ответы, полученные не с этой версией промпта"""
+        stale = [key for key, entry in self._entries.items() if entry.prompt_version != prompt_version]
+        for key in stale:
+            del self._entries[key]
+        if stale:
+            logger.info(f"System prompt changed (version {prompt_version}), {len(stale)} cached answers dropped")
+
+    def get(self, question: str, prompt_version=None) -> Optional[str]:
+        now = time.monotonic()
+        key = normalize_question(question)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.prompt_version == prompt_version:
+            if now - entry.created_at <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits_exact += 1
+                return entry.answer
+            del self._entries[key]
+
+        if self.similarity_threshold < 1.0 and self._entries:
+            vector = self.embedder(key)
+            keys = key_tokens(question)
+            best_key, best_score = None, self.similarity_threshold
+            expired = []
+            for cached_key, cached in self._entries.items():
+                if now - cached.created_at > self.ttl:
+                    expired.append(cached_key)
+                    continue
+                if cached.keys != keys or cached.prompt_version != prompt_version:
+                    continue
+                score = cosine(vector, cached.vector)
+                if score >= best_score:
+                    best_key, best_score = cached_key, score
+            for cached_key in expired:
+                del self._entries[cached_key]
+            if best_key is not None:
+                self._entries.move_to_end(best_key)
+                self.hits_similar += 1
+                logger.info(f"Answer cache near-duplicate hit ({best_score:.2f}): {question!r} ~ {best_key!r}")
+                return self._entries[best_key].answer
+
+        self.misses += 1
+        return None
+
+    def put(self, question: str, answer: str, prompt_version=None):
+        key = normalize_question(question)
+        self._entries[key] = _Entry(answer, self.embedder(key), key_tokens(question), time.monotonic(),
+                                    prompt_version)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+SHED_POLICIES = ("drop_lowest", "reject_new")
+
+
+class AnswerWorkerPool:
+    """Очередь генерации ответов с фиксированным числом воркеров.
+
+    Задания выбираются по приоритету (меньше — раньше, при равенстве — FIFO).
+    Глубина очереди ограничена max_depth; при переполнении по политике
+    drop_lowest вытесняется задание с худшим приоритетом (если новое лучше),
+    по политике reject_new отбрасывается новое. Отброшенные задания
+    передаются в on_shed.
+    """
+
+    def __init__(self, handler: Callable[..., Awaitable], workers: int = 4, max_depth: int = 200,
+                 shed_policy: str = "drop_lowest", on_shed: Optional[Callable] = None):
+        if shed_policy not in SHED_POLICIES:
+            raise ValueError(f"Unknown shed policy: {shed_policy}")
+        self.handler = handler
+        self.workers = workers
+        self.max_depth = max_depth
+        self.shed_policy = shed_policy
+        self.on_shed = on_shed
+        self._heap = []
+        self._counter = itertools.count()
+        self._not_empty = asyncio.Event()
+        self._tasks = []
+        self._shed_tasks = set()
+        self._stopping = False
+        self._busy = 0
+        self._waits = deque(maxlen=1000)
+        self.submitted = 0
+        self.processed = 0
+        self.shed = 0
+        self.failed = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def submit(self, priority: int, **job) -> bool:
+        """Ставит handler(**job) в очередь; False, если задание отброшено"""
+        self.submitted += 1
+        item = (priority, next(self._counter), time.monotonic(), job)
+
+        if len(self._heap) >= self.max_depth:
+            worst = max(self._heap)
+            if self.shed_policy == "reject_new" or item > worst:
+                self._shed(job)
+                return False
+            self._heap.remove(worst)
+            heapq.heapify(self._heap)
+            self._shed(worst[3])
+
+        heapq.heappush(self._heap, item)
+        self._not_empty.set()
+        return True
+
+    def _shed(self, job: dict):
+        self.shed += 1
+        logger.warning(f"Answer queue is full ({self.max_depth}), job shed: {job}")
+        if self.on_shed is not None:
+            result = self.on_shed(**job)
+            if asyncio.iscoroutine(result):
+                # Ссылка на задачу — чтобы её не собрал сборщик мусора и ошибка попала в лог
+                task = asyncio.ensure_future(result)
+                self._shed_tasks.add(task)
+                task.add_done_callback(self._shed_done)
+
+    def _shed_done(self, task: asyncio.Task):
+        self._shed_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Answer queue on_shed error: {task.exception()}")
+
+    def start(self):
+        if not self._tasks:
+            self._stopping = False
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0):
+        """Останавливает воркеров: начатые задания дорабатывают не дольше timeout секунд,
+        ещё не начатые остаются в очереди (в базе их due_at не сброшен)"""
+        self._stopping = True
+        self._not_empty.set()
+        if self._tasks:
+            _, unfinished = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in unfinished:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            if unfinished:
+                logger.warning(f"Answer queue stopped with {len(unfinished)} unfinished jobs")
+        self._tasks = []
+        await asyncio.gather(*self._shed_tasks, return_exceptions=True)
+
+    async def _worker(self):
+        while True:
+            while not self._heap and not self._stopping:
+                self._not_empty.clear()
+                await self._not_empty.wait()
+            if self._stopping:
+                return
+
+            _, _, enqueued_at, job = heapq.heappop(self._heap)
+            self._waits.append(time.monotonic() - enqueued_at)
+            self._busy += 1
+            try:
+                await self.handler(**job)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Answer worker error: {e}")
+            finally:
+                self._busy -= 1
+                self.processed += 1
+
+    def stats(self) -> dict:
+        """Метрики очереди: глубина, занятость воркеров, время ожидания (секунды)"""
+        waits = sorted(self._waits)
+
+        def percentile(p):
+            return waits[min(len(waits) - 1, int(len(waits) * p))] if waits else 0.0
+
+        return {
+            "depth": len(self._heap),
+            "max_depth": self.max_depth,
+            "busy_workers": self._busy,
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "shed": self.shed,
+            "failed": self.failed,
+            "wait_p50": percentile(0.5),
+            "wait_p95": percentile(0.95),
+            "wait_max": waits[-1] if waits else 0.0,
+        }
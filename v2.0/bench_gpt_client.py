@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""Нагрузочный бенчмарк клиента YandexGPT на локальном заглушечном сервере.
+
+Поднимает aiohttp-сервер, отвечающий в формате completion API с заданной
+задержкой, и прогоняет N вопросов, пришедших одновременно (задержка ответа
+считается от момента их прихода):
+  - blocking — старый путь: requests.post прямо в event loop;
+  - async    — YandexGPTClient с общей сессией и лимитом параллельности.
+
+Пример:
+    python bench_gpt_client.py --questions 200 --latency 0.2 --concurrency 1 8 32
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from aiohttp import web
+
+from gpt_client import YandexGPTClient
+
+SYSTEM_PROMPT = "Системный промпт " * 2000
+QUESTION = "Какие проходные баллы на ИВТ?"
+
+
+async def start_stub_server(latency: float, port: int) -> web.AppRunner:
+    async def completion(request: web.Request) -> web.Response:
+        await request.json()
+        await asyncio.sleep(latency)
+        return web.json_response({
+            "result": {"alternatives": [{"message": {"role": "assistant", "text": "Проходной балл 241"}}]}
+        })
+
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app.router.add_post("/foundationModels/v1/completion", completion)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def run_blocking(url: str, questions: int) -> list:
+    import requests
+
+    latencies = []
+    start = time.perf_counter()
+
+    async def one():
+        requests.post(url, json={"messages": [{"role": "system", "text": SYSTEM_PROMPT},
+                                              {"role": "user", "text": QUESTION}]}).json()
+        latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(questions)))
+    return latencies
+
+
+async def run_async(url: str, questions: int, concurrency: int) -> list:
+    client = YandexGPTClient("token", "folder", url=url, max_concurrency=concurrency)
+    latencies = []
+    start = time.perf_counter()
+
+    async def one():
+        await client.complete(SYSTEM_PROMPT, QUESTION)
+        latencies.append(time.perf_counter() - start)
+
+    try:
+        await asyncio.gather(*(one() for _ in range(questions)))
+    finally:
+        await client.close()
+    return latencies
+
+
+def report(name: str, latencies: list, elapsed: float):
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<16} {len(latencies) / elapsed:8.1f} q/s   "
+          f"p50 {statistics.median(latencies) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2, help="задержка заглушки, секунды")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--skip-blocking", action="store_true")
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{args.port}/foundationModels/v1/completion"
+    runner = await start_stub_server(args.latency, args.port)
+    print(f"{args.questions} вопросов, задержка заглушки {args.latency * 1000:.0f} ms")
+    try:
+        if not args.skip_blocking:
+            # requests.post заблокировал бы loop заглушки, поэтому старый путь
+            # крутится в своём loop в отдельном потоке — как раньше в боте
+            start = time.perf_counter()
+            latencies = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: asyncio.run(run_blocking(url, args.questions))
+            )
+            report("blocking", latencies, time.perf_counter() - start)
+
+        for concurrency in args.concurrency:
+            start = time.perf_counter()
+            latencies = await run_async(url, args.questions, concurrency)
+            report(f"async x{concurrency}", latencies, time.perf_counter() - start)
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""Микробенчмарк накладных расходов SQLite на одно входящее сообщение.
+
+Повторяет запросы, которые бот делает на каждый вопрос (проверка лимита,
+сохранение вопроса и лога, обновление счётчика, проверки admin_replied и
+отметка answered):
+  - before — connection-per-query к отдельным файлам баз, как было раньше;
+  - after  — текущий путь бота: лимит — token bucket в памяти
+             (rate_limiter.py) без запросов к базе, Storage над единой
+             bot.db (постоянное соединение, пачечные коммиты, индексы),
+             вопрос вместе с агрегатами /stats — одна пачка.
+
+Запись в Storage возвращается после коммита своей пачки, поэтому сообщения
+after обрабатываются конкурентно (до --concurrency одновременно), как
+апдейты в боте. При малой конкурентности замер показывает ожидание коммита
+(commit_interval), а не накладные расходы.
+
+Пример:
+    python bench_storage.py --messages 2000
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+from datetime import datetime
+
+import stats
+from rate_limiter import TokenBucketLimiter
+from schema import migrate
+from storage import Storage
+
+SCHEMA = {
+    "questions": [
+        '''CREATE TABLE questions
+           (id INTEGER PRIMARY KEY AUTOINCREMENT, msg_id INTEGER, chat_id INTEGER, user_id INTEGER,
+            question TEXT, timestamp DATETIME, answered BOOLEAN DEFAULT FALSE, topic_id INTEGER,
+            admin_replied BOOLEAN DEFAULT FALSE)''',
+        '''CREATE TABLE users
+           (user_id INTEGER PRIMARY KEY, last_question_time DATETIME, question_count INTEGER DEFAULT 0)''',
+    ],
+    "questions_log": [
+        '''CREATE TABLE questions_log
+           (id INTEGER PRIMARY KEY AUTOINCREMENT, question TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+    ],
+}
+
+QUESTION = "Какие проходные баллы на ИВТ?"
+
+
+def message_queries(i: int):
+    """(база, запрос, параметры, запись?) для одного сообщения в старой схеме"""
+    user_id = i % 300
+    now = datetime.now()
+    return [
+        ("questions", "SELECT question_count FROM users WHERE user_id=?", (user_id,), False),
+        ("questions", '''INSERT INTO questions (msg_id, chat_id, user_id, question, timestamp, topic_id)
+                         VALUES (?, ?, ?, ?, ?, ?)''', (i, -100, user_id, QUESTION, now, 2), True),
+        ("questions_log", "INSERT INTO questions_log (question) VALUES (?)", (QUESTION,), True),
+        ("questions", '''INSERT OR REPLACE INTO users (user_id, last_question_time, question_count)
+                         VALUES (?, ?, COALESCE((SELECT question_count FROM users WHERE user_id=?) + 1, 1))''',
+         (user_id, now, user_id), True),
+    ] + answer_queries(i)
+
+
+def answer_queries(i: int):
+    return [
+        ("questions", "SELECT admin_replied FROM questions WHERE msg_id=?", (i,), False),
+        ("questions", "SELECT question FROM questions WHERE msg_id=? AND answered=0", (i,), False),
+        ("questions", "SELECT admin_replied FROM questions WHERE msg_id=?", (i,), False),
+        ("questions", "UPDATE questions SET answered=1 WHERE msg_id=?", (i,), True),
+    ]
+
+
+def create_databases(directory: str) -> dict:
+    paths = {}
+    for name, statements in SCHEMA.items():
+        paths[name] = os.path.join(directory, f"{name}.db")
+        with closing(sqlite3.connect(paths[name])) as conn:
+            for statement in statements:
+                conn.execute(statement)
+            conn.commit()
+    return paths
+
+
+def run_before(paths: dict, messages: int) -> float:
+    start = time.perf_counter()
+    for i in range(messages):
+        for name, query, params, write in message_queries(i):
+            with closing(sqlite3.connect(paths[name])) as conn:
+                conn.execute("PRAGMA foreign_keys = ON")
+                c = conn.cursor()
+                c.execute(query, params)
+                if write:
+                    conn.commit()
+                c.fetchall()
+    return time.perf_counter() - start
+
+
+async def handle_after(storage: Storage, limiter: TokenBucketLimiter, i: int):
+    user_id = i % 300
+    if not await limiter.hit(user_id):
+        return
+    await storage.execute_batch([(
+        '''INSERT INTO questions (msg_id, chat_id, user_id, question, topic_id, due_at)
+           VALUES (?, ?, ?, ?, ?, ?)''', (i, -100, user_id, QUESTION, 2, time.time())
+    )] + stats.question_statements(QUESTION))
+    await storage.fetchall("SELECT question, admin_replied FROM questions WHERE msg_id=? AND answered=0", (i,))
+    await storage.execute("UPDATE questions SET answered=1 WHERE msg_id=?", (i,))
+    await storage.execute("UPDATE questions SET due_at=NULL WHERE msg_id=?", (i,))
+
+
+async def run_after(path: str, messages: int, concurrency: int) -> float:
+    storage = Storage(path)
+    storage.setup(lambda conn: migrate(conn, os.path.dirname(path)))
+    # Лимит с запасом: в замере все вопросы должны пройти
+    limiter = TokenBucketLimiter(messages)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def handle(i: int):
+        async with semaphore:
+            await handle_after(storage, limiter, i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handle(i) for i in range(messages)))
+    await storage.transaction([
+        ("INSERT OR REPLACE INTO rate_limits (user_id, tokens, updated_at) VALUES (?, ?, ?)", row)
+        for row in limiter.snapshot()
+    ])
+    elapsed = time.perf_counter() - start
+    await storage.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    args = parser.parse_args()
+
+    per_message = len(message_queries(0))
+    print(f"{args.messages} сообщений, {per_message} запросов на сообщение")
+    with tempfile.TemporaryDirectory() as directory:
+        before = run_before(create_databases(directory), args.messages)
+    with tempfile.TemporaryDirectory() as directory:
+        after = asyncio.run(run_after(os.path.join(directory, "bot.db"), args.messages, args.concurrency))
+    for name, elapsed in (("before", before), ("after", after)):
+        print(f"{name:<8} {elapsed / args.messages * 1e6:9.1f} µs/сообщение   {args.messages / elapsed:9.1f} сообщений/с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class DelayedResponseQueue:
+    """Очередь отложенных ответов с одним таймером на все вопросы.
+
+    Вместо спящей корутины на каждый вопрос задания лежат в куче по времени
+    срабатывания (unix time), а одна фоновая задача спит до ближайшего из них.
+    Сама очередь живёт в памяти; сохранность между перезапусками обеспечивает
+    колонка questions.due_at, из которой очередь заполняется при старте.
+    handler может быть обычной функцией (например, постановка в пул
+    воркеров) или корутиной — тогда она запускается отдельной задачей.
+    """
+
+    def __init__(self, handler: Callable):
+        self.handler = handler
+        self._heap = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._running = set()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, due_at: float, **job):
+        """Ставит вызов handler(**job) на момент due_at"""
+        heapq.heappush(self._heap, (due_at, next(self._counter), job))
+        if self._heap[0][2] is job:
+            self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            if not self._heap:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            while self._heap and self._heap[0][0] <= time.time():
+                _, _, job = heapq.heappop(self._heap)
+                self._dispatch(job)
+
+    def _dispatch(self, job: dict):
+        try:
+            result = self.handler(**job)
+        except Exception as e:
+            logger.error(f"Delayed job dispatch error: {e}")
+            return
+        if asyncio.iscoroutine(result):
+            task = asyncio.create_task(result)
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""Офлайн-сравнение компактного (RAG) промпта с полным.
+
+Эталон — feedback_history.csv: ответы бота с 👍 считаются правильными.
+Без --llm проверяется только отбор фрагментов: какая доля фактов из
+эталонного ответа (числа, коды направлений, аббревиатуры, названия в
+кавычках), присутствующих в полном промпте, попала в компактный, и
+насколько он короче. С --llm оба промпта отправляются в YandexGPT
+(нужны IAM_TOKEN и FOLDER_ID), сравниваются inputTextTokens из usage,
+время ответа и совпадение фактов ответа с эталоном.
+
+    python eval_rag.py --top-k 15 --extra ../demo/custom_questions.txt
+    python eval_rag.py --top-k 15 --llm --limit 30
+"""
+import argparse
+import asyncio
+import csv
+import os
+import re
+import statistics
+import time
+
+from dotenv import load_dotenv
+
+from gpt_client import YandexGPTClient, YandexGPTError
+from knowledge import KnowledgeIndex, load_extra_sources
+
+_FACT_RE = re.compile(r"\d{2}\.\d{2}\.\d{2}|\d{2,}|\b[А-ЯЁA-Z]{2,}\b|«[^»]+»")
+
+
+def facts(text: str) -> set:
+    return {fact.lower() for fact in _FACT_RE.findall(text)}
+
+
+def estimate_tokens(chars: float) -> int:
+    """Грубая оценка для русского текста (~3.5 символа на токен)"""
+    return round(chars / 3.5)
+
+
+def load_feedback(path: str):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return [row for row in csv.DictReader(f, delimiter=";") if row["question_text"] and row["bot_answer"]]
+
+
+def f1(predicted: set, expected: set) -> float:
+    if not predicted or not expected:
+        return float(predicted == expected)
+    common = len(predicted & expected)
+    if common == 0:
+        return 0.0
+    precision, recall = common / len(predicted), common / len(expected)
+    return 2 * precision * recall / (precision + recall)
+
+
+def evaluate_retrieval(index: KnowledgeIndex, full_prompt: str, rows):
+    full_facts = facts(full_prompt)
+    recalls = {"👍": [], "👎": []}
+    sizes, build_times = [], []
+    for row in rows:
+        started = time.perf_counter()
+        compact = index.build_prompt(row["question_text"])
+        build_times.append(time.perf_counter() - started)
+        sizes.append(len(compact))
+
+        expected = facts(row["bot_answer"]) & full_facts
+        if expected and row["feedback"] in recalls:
+            recalls[row["feedback"]].append(len(expected & facts(compact)) / len(expected))
+
+    print(f"Questions: {len(rows)}, chunks in index: {len(index.chunks)}")
+    print(f"Full prompt:    {len(full_prompt):>7} chars, ~{estimate_tokens(len(full_prompt))} tokens")
+    print(f"Compact prompt: {statistics.mean(sizes):>7.0f} chars avg, max {max(sizes)}, "
+          f"~{estimate_tokens(statistics.mean(sizes))} tokens "
+          f"({statistics.mean(sizes) / len(full_prompt):.0%} of full)")
+    print(f"Prompt build:   {statistics.mean(build_times) * 1000:.2f} ms avg")
+    for feedback, values in recalls.items():
+        if values:
+            print(f"Fact recall {feedback}:  {statistics.mean(values):.1%} "
+                  f"({sum(v == 1 for v in values)}/{len(values)} answers fully covered)")
+
+
+async def evaluate_llm(index: KnowledgeIndex, full_prompt: str, rows, concurrency: int):
+    load_dotenv()
+    client = YandexGPTClient(os.getenv("IAM_TOKEN"), os.getenv("FOLDER_ID"), max_concurrency=concurrency)
+
+    async def run(system_prompt: str, question: str):
+        started = time.perf_counter()
+        try:
+            text, usage = await client.complete_with_usage(system_prompt, question)
+        except YandexGPTError as e:
+            print(f"YandexGPT error: {e}")
+            return None
+        return text, int(usage.get("inputTextTokens", 0)), time.perf_counter() - started
+
+    try:
+        results = {"full": [], "rag": []}
+        for row in rows:
+            question = row["question_text"]
+            full, rag = await asyncio.gather(
+                run(full_prompt, question),
+                run(index.build_prompt(question), question)
+            )
+            if full is None or rag is None:
+                continue
+            expected = facts(row["bot_answer"])
+            for name, (text, tokens, latency) in (("full", full), ("rag", rag)):
+                results[name].append((tokens, latency, f1(facts(text), expected)))
+    finally:
+        await client.close()
+
+    print(f"\nLLM comparison on {len(results['full'])} liked answers:")
+    for name, values in results.items():
+        if not values:
+            continue
+        tokens, latencies, scores = zip(*values)
+        print(f"  {name:<4}: input tokens {statistics.mean(tokens):>7.0f}, "
+              f"latency {statistics.mean(latencies):.2f} s, fact F1 vs reference {statistics.mean(scores):.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompt", default="system_prompt.txt")
+    parser.add_argument("--feedback", default="feedback_history.csv")
+    parser.add_argument("--extra", nargs="*", default=[], help="доп. источники вопрос-ответ (.txt/.csv)")
+    parser.add_argument("--top-k", type=int, default=15)
+    parser.add_argument("--max-chars", type=int, default=6000)
+    parser.add_argument("--llm", action="store_true", help="сравнить ответы YandexGPT на обоих промптах")
+    parser.add_argument("--limit", type=int, default=30, help="вопросов для --llm")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    with open(args.prompt, encoding="utf-8") as f:
+        full_prompt = f.read()
+    index = KnowledgeIndex(full_prompt, load_extra_sources(args.extra), top_k=args.top_k, max_chars=args.max_chars)
+    rows = load_feedback(args.feedback)
+
+    evaluate_retrieval(index, full_prompt, rows)
+    if args.llm:
+        liked = [row for row in rows if row["feedback"] == "👍"][:args.limit]
+        asyncio.run(evaluate_llm(index, full_prompt, liked, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
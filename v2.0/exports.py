@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import sqlite3
+from contextlib import closing
+from typing import List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Сколько строк забирать из курсора за раз
+FETCH_ROWS = 500
+# Бот может отправить документ до 50 МБ; части режем с запасом на недописанный буфер сжатия
+PART_LIMIT = 45 * 1024 * 1024
+# Объём текста (символов) в группе строк Parquet: крупнее — лучше сжатие, но больше держится в памяти.
+# Должен быть заметно меньше запаса PART_LIMIT: размер части известен только после записи группы
+PARQUET_ROW_GROUP_CHARS = 4 * 1024 * 1024
+FORMATS = ("csv", "parquet")
+FEEDBACK_TYPES = {"like": "👍", "dislike": "👎"}
+
+
+class Export(NamedTuple):
+    """Выгрузка таблицы (или представления с колонкой id) в CSV"""
+    source: str
+    columns: List[str]
+    csv_path: str
+
+
+FEEDBACK_EXPORT = Export(
+    "feedback_log",
+    ["id", "message_id", "question_text", "bot_answer", "feedback", "user_id", "timestamp"],
+    "feedback_history.csv",
+)
+QUESTIONS_EXPORT = Export("questions_log", ["id", "question", "timestamp"], "questions_history.csv")
+
+
+def _watermark_path(csv_path: str) -> str:
+    return csv_path + ".watermark.json"
+
+
+def _scan_last_id(csv_path: str) -> int:
+    last_id = 0
+    with open(csv_path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f, delimiter=";"):
+            try:
+                last_id = max(last_id, int(row["id"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+    return last_id
+
+
+def read_watermark(csv_path: str) -> int:
+    """Последний выгруженный id.
+
+    Берётся из файла состояния рядом с CSV, если размер CSV с ним совпадает;
+    иначе (первый запуск, CSV правили вручную, выгрузка оборвалась) — одним
+    проходом по самому CSV.
+    """
+    if not os.path.exists(csv_path):
+        return 0
+    try:
+        with open(_watermark_path(csv_path), encoding="utf-8") as f:
+            state = json.load(f)
+        if state["size"] == os.path.getsize(csv_path):
+            return state["last_id"]
+    except (OSError, ValueError, KeyError):
+        pass
+    last_id = _scan_last_id(csv_path)
+    logger.info(f"Export watermark for {csv_path} restored from the file: id {last_id}")
+    return last_id
+
+
+def write_watermark(csv_path: str, last_id: int):
+    state = {"last_id": last_id, "size": os.path.getsize(csv_path)}
+    tmp_path = _watermark_path(csv_path) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, _watermark_path(csv_path))
+
+
+def export_incremental(db_path: str, export: Export) -> int:
+    """Дописывает в CSV строки с id больше водяного знака; возвращает их число.
+
+    Строки читаются курсором по FETCH_ROWS в порядке id и сразу пишутся в
+    файл, старые строки CSV не перечитываются и не переписываются. Функция
+    блокирующая — из бота её нужно вызывать в отдельном потоке.
+    """
+    last_id = read_watermark(export.csv_path)
+    new_file = not os.path.exists(export.csv_path) or os.path.getsize(export.csv_path) == 0
+    query = f"SELECT {', '.join(export.columns)} FROM {export.source} WHERE id > ? ORDER BY id"
+
+    written = 0
+    # Только чтение: админ-бот не держит блокировок записи в базе основного бота
+    with closing(sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)) as conn, \
+            open(export.csv_path, "a", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        if new_file:
+            # BOM — чтобы Excel открывал файл в UTF-8 (при дозаписи его писать нельзя)
+            f.write("\ufeff")
+            writer.writerow(export.columns)
+        cursor = conn.execute(query, (last_id,))
+        while True:
+            rows = cursor.fetchmany(FETCH_ROWS)
+            if not rows:
+                break
+            writer.writerows(rows)
+            last_id = rows[-1][0]
+            written += len(rows)
+        f.flush()
+        os.fsync(f.fileno())
+
+    write_watermark(export.csv_path, last_id)
+    logger.info(f"Exported {written} new rows from {export.source} to {export.csv_path} (last id {last_id})")
+    return written
+
+
+class ExportFilter(NamedTuple):
+    """Условия выгрузки; даты — строки ГГГГ-ММ-ДД, обе включительно"""
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    feedback: Optional[str] = None
+
+
+def _filtered_query(export: Export, export_filter: ExportFilter):
+    # Условия уходят в SQL: по timestamp работают индексы idx_*_timestamp
+    conditions, params = [], []
+    if export_filter.date_from:
+        conditions.append("timestamp >= ?")
+        params.append(export_filter.date_from)
+    if export_filter.date_to:
+        conditions.append("timestamp < date(?, '+1 day')")
+        params.append(export_filter.date_to)
+    if export_filter.feedback:
+        if "feedback" not in export.columns:
+            raise ValueError(f"{export.source} has no feedback column")
+        conditions.append("feedback = ?")
+        params.append(export_filter.feedback)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"SELECT {', '.join(export.columns)} FROM {export.source}{where} ORDER BY id", params
+
+
+class _CsvGzipPart:
+    """Часть выгрузки: CSV (;, UTF-8 с BOM), сжатый gzip на лету"""
+    extension = ".csv.gz"
+
+    def __init__(self, path: str, columns: List[str]):
+        self._raw = open(path, "wb")
+        self._text = io.TextIOWrapper(gzip.GzipFile(fileobj=self._raw, mode="wb"), encoding="utf-8", newline="")
+        self._writer = csv.writer(self._text, delimiter=";")
+        self._text.write("\ufeff")
+        self._writer.writerow(columns)
+
+    def write(self, rows: list):
+        self._writer.writerows(rows)
+
+    def size(self) -> int:
+        self._text.flush()
+        return self._raw.tell()
+
+    def close(self):
+        self._text.close()
+        self._raw.close()
+
+
+class _ParquetPart:
+    """Часть выгрузки: Parquet (zstd), строки копятся до PARQUET_ROW_GROUP_CHARS и пишутся группой"""
+    extension = ".parquet"
+
+    def __init__(self, path: str, columns: List[str]):
+        import pyarrow  # необязательная зависимость
+        import pyarrow.parquet
+
+        self._pa = pyarrow
+        self._schema = pyarrow.schema([
+            (name, pyarrow.int64() if name == "id" or name.endswith("_id") else pyarrow.string())
+            for name in columns
+        ])
+        self._raw = open(path, "wb")
+        self._writer = pyarrow.parquet.ParquetWriter(self._raw, self._schema, compression="zstd")
+        self._rows = []
+        self._buffered = 0
+
+    def _flush_rows(self):
+        if not self._rows:
+            return
+        arrays = []
+        for field, values in zip(self._schema, zip(*self._rows)):
+            # SQLite не проверяет типы колонок: приводим явно
+            convert = int if field.type == self._pa.int64() else str
+            arrays.append(self._pa.array([None if value is None else convert(value) for value in values],
+                                         type=field.type))
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self._schema))
+        self._rows = []
+        self._buffered = 0
+
+    def write(self, rows: list):
+        self._rows.extend(rows)
+        self._buffered += sum(len(str(value)) for row in rows for value in row)
+        if self._buffered >= PARQUET_ROW_GROUP_CHARS:
+            self._flush_rows()
+
+    def size(self) -> int:
+        return self._raw.tell()
+
+    def close(self):
+        self._flush_rows()
+        self._writer.close()
+        self._raw.close()
+
+
+_PARTS = {"csv": _CsvGzipPart, "parquet": _ParquetPart}
+
+
+def export_filtered(db_path: str, export: Export, directory: str, export_filter: ExportFilter = ExportFilter(),
+                    fmt: str = "csv", part_limit: int = PART_LIMIT) -> List[str]:
+    """Выгружает строки под фильтр в directory; возвращает пути файлов (пусто — строк нет).
+
+    Строки идут из курсора пачками прямо в сжимающий writer, в памяти не
+    собираются. Когда часть дорастает до part_limit байт, начинается новая
+    (каждая — самостоятельный файл с заголовком/схемой). Функция блокирующая.
+    """
+    if fmt not in _PARTS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    part_class = _PARTS[fmt]
+    query, params = _filtered_query(export, export_filter)
+    base = os.path.join(directory, os.path.splitext(os.path.basename(export.csv_path))[0])
+
+    paths = []
+    part = None
+    with closing(sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)) as conn:
+        cursor = conn.execute(query, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(FETCH_ROWS)
+                if not rows:
+                    break
+                if part is None:
+                    paths.append(f"{base}.part{len(paths) + 1}{part_class.extension}")
+                    part = part_class(paths[-1], export.columns)
+                part.write(rows)
+                if part.size() >= part_limit:
+                    part.close()
+                    part = None
+        finally:
+            if part is not None:
+                part.close()
+
+    # Если часть одна, суффикс .part1 не нужен
+    if len(paths) == 1:
+        os.replace(paths[0], base + part_class.extension)
+        paths = [base + part_class.extension]
+    logger.info(f"Exported {export.source} {export_filter} as {fmt}: {len(paths)} file(s)")
+    return paths
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+COMPLETION_URL = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+
+
+class YandexGPTError(Exception):
+    """Ошибка обращения к YandexGPT"""
+
+
+class YandexGPTClient:
+    """Асинхронный клиент YandexGPT.
+
+    Все запросы идут через одну aiohttp-сессию с keep-alive пулом соединений,
+    число одновременных запросов ограничено семафором, у каждого запроса
+    свой таймаут.
+    """
+
+    def __init__(self, iam_token: str, folder_id: str, model: str = "yandexgpt",
+                 url: str = COMPLETION_URL, max_concurrency: int = 8,
+                 timeout: float = 60.0, connect_timeout: float = 10.0,
+                 keepalive_timeout: float = 60.0,
+                 temperature: float = 0.3, max_tokens: int = 1000):
+        self.iam_token = iam_token
+        self.folder_id = folder_id
+        self.model = model
+        self.url = url
+        self.max_concurrency = max_concurrency
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self._timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self._keepalive_timeout = keepalive_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Создаёт общую сессию при первом запросе (внутри event loop)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency,
+                keepalive_timeout=self._keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self._timeout,
+                headers={
+                    "Authorization": f"Bearer {self.iam_token}",
+                    "Content-Type": "application/json",
+                },
+            )
+        return self._session
+
+    def build_payload(self, system_prompt: str, question: str) -> dict:
+        return {
+            "modelUri": f"gpt://{self.folder_id}/{self.model}",
+            "completionOptions": {
+                "temperature": self.temperature,
+                "maxTokens": self.max_tokens
+            },
+            "messages": [
+                {
+                    "role": "system",
+                    "text": system_prompt
+                },
+                {
+                    "role": "user",
+                    "text": question
+                }
+            ]
+        }
+
+    async def complete(self, system_prompt: str, question: str) -> str:
+        """Возвращает текст ответа модели или бросает YandexGPTError"""
+        text, _ = await self.complete_with_usage(system_prompt, question)
+        return text
+
+    async def complete_with_usage(self, system_prompt: str, question: str):
+        """То же, что complete, плюс usage из ответа API (inputTextTokens, completionTokens)"""
+        payload = self.build_payload(system_prompt, question)
+        async with self._semaphore:
+            session = self._get_session()
+            try:
+                async with session.post(self.url, json=payload) as response:
+                    try:
+                        data = await response.json(content_type=None)
+                    except ValueError:
+                        # Не JSON: например, HTML-страница ошибки от прокси
+                        body = await response.text(errors="replace")
+                        raise YandexGPTError(f"HTTP {response.status}: non-JSON response {body[:200]!r}")
+                    if response.status != 200:
+                        raise YandexGPTError(f"HTTP {response.status}: {data}")
+            except asyncio.TimeoutError:
+                raise YandexGPTError("timeout")
+            except aiohttp.ClientError as e:
+                raise YandexGPTError(str(e))
+
+        try:
+            result = data['result']
+            return result['alternatives'][0]['message']['text'], result.get('usage', {})
+        except (KeyError, IndexError, TypeError):
+            raise YandexGPTError(f"Unexpected response: {data}")
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
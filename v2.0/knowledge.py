@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+import csv
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import List, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Строка промпта, после которой начинаются данные; всё до неё — инструкции модели
+DATA_MARKER = "Вот тебе данные"
+EXTRA_SECTION = "Ответы на частые вопросы"
+
+_TOKEN_RE = re.compile(r"\d+(?:[.,]\d+)*|[a-zа-я]+")
+_STOPWORDS = frozenset(
+    "и в во на с со по за для а ли не ни что как какие какой какая каком у о об от до из к ко же "
+    "мне меня я мы вы вас нас он она они это ещё еще или но то бы если при про так там тут уже "
+    "можно ли будет есть нужно здравствуйте подскажите пожалуйста добрый день".split()
+)
+# Аббревиатуры из вопросов абитуриентов, которых нет в тексте данных
+_ABBREVIATIONS = {
+    "ивт": "информатика вычислительная техника",
+    "пи": "прикладная информатика",
+    "пии": "прикладной искусственный интеллект",
+    "аии": "алгоритмы искусственного интеллекта",
+    "ии": "искусственный интеллект",
+    "иб": "информационная безопасность",
+    "бкс": "безопасность компьютерных систем",
+    "итсс": "инфокоммуникационные технологии системы связи",
+    "утс": "управление технических системах",
+    "ктэс": "конструирование технология электронных средств",
+    "вуц": "военный учебный центр",
+    "нкц": "новокольцово",
+    "лк": "личный кабинет",
+    "гу": "госуслуги",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Токены для поиска: числа и коды целиком, слова — по первым 6 буквам (грубый стемминг)"""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower().replace("ё", "е")):
+        if token[0].isdigit():
+            tokens.append(token)
+        elif token in _ABBREVIATIONS:
+            tokens.append(token)
+            tokens.extend(word[:6] for word in _ABBREVIATIONS[token].split())
+        elif len(token) > 1 and token not in _STOPWORDS:
+            tokens.append(token[:6])
+    return tokens
+
+
+class Chunk(NamedTuple):
+    section: str
+    text: str
+    order: int
+    search_text: str = ""
+
+
+def split_prompt(prompt: str):
+    """Делит промпт на инструкции и фрагменты данных (по строке на фрагмент)"""
+    marker = prompt.find(DATA_MARKER)
+    if marker == -1:
+        return prompt, []
+    data_start = prompt.find("\n", marker)
+    instructions = prompt[:data_start if data_start != -1 else len(prompt)].rstrip()
+    if data_start == -1:
+        return instructions, []
+
+    chunks = []
+    for block in re.split(r"\n\s*\n", prompt[data_start:]):
+        lines = [line.strip() for line in block.strip().splitlines() if line.strip()]
+        if not lines:
+            continue
+        section = ""
+        if lines[0].endswith(":") or (len(lines) > 1 and len(lines[0]) < 60 and ":" not in lines[0]):
+            section = lines.pop(0).rstrip(":")
+        for line in lines:
+            chunks.append(Chunk(section, line, len(chunks)))
+    return instructions, chunks
+
+
+def load_extra_chunks(path: str, start_order: int = 0) -> List[Chunk]:
+    """Пары вопрос-ответ из CSV (колонки Вопрос/Ответ) или txt в формате custom_questions.txt"""
+    pairs = []
+    if path.endswith(".csv"):
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            questions_by_answer = defaultdict(list)
+            for row in csv.DictReader(f):
+                if row.get("Ответ") and row.get("Вопрос"):
+                    questions_by_answer[row["Ответ"].strip()].append(row["Вопрос"].strip())
+        pairs = [(questions, answer) for answer, questions in questions_by_answer.items()]
+    else:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        for block in re.split(r"(?m)^\d+\.\s+", text):
+            question, _, answer = block.partition("Ответ:")
+            if question.strip() and answer.strip():
+                pairs.append(([question.strip()], answer.strip()))
+
+    chunks = []
+    for questions, answer in pairs:
+        answer = " ".join(answer.split())
+        chunks.append(Chunk(
+            EXTRA_SECTION,
+            f"В: {questions[0]} О: {answer}",
+            start_order + len(chunks),
+            " ".join(questions) + " " + answer
+        ))
+    return chunks
+
+
+class KnowledgeIndex:
+    """BM25-индекс по фрагментам данных промпта и дополнительным источникам.
+
+    build_prompt собирает компактный промпт: инструкции целиком плюс top_k
+    самых релевантных вопросу фрагментов (не больше max_chars символов),
+    сгруппированных по исходным разделам.
+    """
+
+    def __init__(self, prompt: str, extra_chunks=(), top_k: int = 15, max_chars: int = 6000,
+                 k1: float = 1.2, b: float = 0.75):
+        self.instructions, chunks = split_prompt(prompt)
+        self.chunks = chunks + [chunk._replace(order=len(chunks) + i) for i, chunk in enumerate(extra_chunks)]
+        self.top_k = top_k
+        self.max_chars = max_chars
+        self.k1 = k1
+        self.b = b
+
+        self._postings = defaultdict(list)
+        self._lengths = []
+        for doc_id, chunk in enumerate(self.chunks):
+            tokens = tokenize(f"{chunk.section} {chunk.search_text or chunk.text}")
+            self._lengths.append(len(tokens))
+            for token, tf in Counter(tokens).items():
+                self._postings[token].append((doc_id, tf))
+        self._avg_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+        n = len(self.chunks)
+        self._idf = {
+            token: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for token, postings in self._postings.items()
+        }
+
+    def search(self, question: str, k: int = None) -> List[Chunk]:
+        scores = defaultdict(float)
+        for token in set(tokenize(question)):
+            idf = self._idf.get(token)
+            if idf is None:
+                continue
+            for doc_id, tf in self._postings[token]:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / self._avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        best = sorted(scores, key=scores.get, reverse=True)[:k or self.top_k]
+        return [self.chunks[doc_id] for doc_id in best]
+
+    def build_prompt(self, question: str) -> str:
+        selected, size = [], 0
+        for chunk in self.search(question):
+            if size + len(chunk.text) > self.max_chars and selected:
+                break
+            selected.append(chunk)
+            size += len(chunk.text)
+
+        parts = [self.instructions]
+        section = None
+        for chunk in sorted(selected, key=lambda c: c.order):
+            if chunk.section != section:
+                section = chunk.section
+                parts.append(f"\n{section}:" if section else "")
+            parts.append(chunk.text)
+        return "\n".join(parts)
+
+
+def load_extra_sources(paths) -> List[Chunk]:
+    chunks = []
+    for path in paths:
+        if not os.path.exists(path):
+            logger.warning(f"Knowledge source not found: {path}")
+            continue
+        chunks.extend(load_extra_chunks(path, len(chunks)))
+    return chunks
@@ -2,18 +2,30 @@
 from aiogram import Bot, Dispatcher, types
 from aiogram.utils import executor
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.utils.exceptions import TelegramAPIError
 import sqlite3
-from datetime import datetime, timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import logging
-from contextlib import closing
-import requests
 import asyncio
 import os
 import re
+import time
 
 from dotenv import load_dotenv
 
+from admin_cache import ChatAdminCache
+from answer_cache import AnswerCache
+from answer_queue import AnswerWorkerPool
+from delayed_queue import DelayedResponseQueue
+from gpt_client import YandexGPTClient, YandexGPTError
+from knowledge import KnowledgeIndex, load_extra_sources
+from metrics import MetricsRegistry, start_http_server
+from prompt_store import PromptStore
+from rate_limiter import RedisTokenBucketLimiter, TokenBucketLimiter
+from schema import migrate
+from storage import Storage
+import stats
+
 # Загрузка переменных окружения
 load_dotenv()
 
@@ -32,9 +44,31 @@ logger = logging.getLogger(__name__)
 CONFIG = {
     "response_delay": float(os.getenv('RESPONSE_DELAY', 0.3)),  # минуты
     "cleanup_interval": int(os.getenv('CLEANUP_INTERVAL', 24)),  # часы
+    "stats_question_ttl": float(os.getenv('STATS_QUESTION_TTL', 30)),  # дни; разовые вопросы старше удаляются из частых
+    "pending_max_age": float(os.getenv('PENDING_MAX_AGE', 6)),  # часы; более старые вопросы после перезапуска не отвечаются
     "max_questions_per_user": int(os.getenv('MAX_QUESTIONS_PER_USER', 50)),  # вопросов в час
+    "rate_limit_snapshot_interval": int(os.getenv('RATE_LIMIT_SNAPSHOT_INTERVAL', 60)),  # секунды
+    "redis_url": os.getenv('REDIS_URL'),  # общий лимит для нескольких реплик, например redis://redis:6379/0
     "allowed_chat_id": int(os.getenv('ALLOWED_CHAT_ID')),  # ID вашего чата
-    "allowed_topic_id": int(os.getenv('ALLOWED_TOPIC_ID', 2))  # ID темы, где работает бот
+    "allowed_topic_id": int(os.getenv('ALLOWED_TOPIC_ID', 2)),  # ID темы, где работает бот
+    "llm_max_concurrency": int(os.getenv('LLM_MAX_CONCURRENCY', 8)),  # одновременных запросов к YandexGPT
+    "llm_timeout": float(os.getenv('LLM_TIMEOUT', 60)),  # секунды на один запрос
+    "answer_cache_size": int(os.getenv('ANSWER_CACHE_SIZE', 500)),  # ответов в кэше
+    "answer_cache_ttl": float(os.getenv('ANSWER_CACHE_TTL', 6)),  # часы
+    "answer_cache_similarity": float(os.getenv('ANSWER_CACHE_SIMILARITY', 0.85)),  # порог похожести, 1 — только точные совпадения
+    "answer_workers": int(os.getenv('ANSWER_WORKERS', 8)),  # воркеров генерации ответов
+    "answer_queue_size": int(os.getenv('ANSWER_QUEUE_SIZE', 200)),  # максимум ответов в очереди
+    "answer_shed_policy": os.getenv('ANSWER_SHED_POLICY', 'drop_lowest'),  # drop_lowest или reject_new
+    "shutdown_timeout": float(os.getenv('SHUTDOWN_TIMEOUT', 8)),  # секунды на начатые ответы при остановке (Docker ждёт 10)
+    "skip_updates": bool(int(os.getenv('SKIP_UPDATES', 0))),  # 1 — не отвечать на сообщения, пришедшие, пока бот был остановлен
+    "metrics_log_interval": int(os.getenv('METRICS_LOG_INTERVAL', 5)),  # минуты
+    "metrics_host": os.getenv('METRICS_HOST', '127.0.0.1'),  # адрес /metrics (Prometheus)
+    "metrics_port": int(os.getenv('METRICS_PORT', 9100)),  # 0 — не поднимать эндпоинт
+    "admin_cache_ttl": int(os.getenv('ADMIN_CACHE_TTL', 10)),  # минуты между обновлениями списка админов
+    "prompt_reload_interval": int(os.getenv('PROMPT_RELOAD_INTERVAL', 60)),  # секунды между проверками нового промпта
+    "rag_top_k": int(os.getenv('RAG_TOP_K', 0)),  # фрагментов данных в промпте; 0 — отправлять промпт целиком
+    "rag_max_chars": int(os.getenv('RAG_MAX_CHARS', 6000)),  # предел объёма выбранных фрагментов
+    "rag_extra_sources": [p for p in os.getenv('RAG_EXTRA_SOURCES', '').split(',') if p]  # доп. файлы вопрос-ответ (.txt/.csv)
 }
 
 # API ключи из переменных окружения
@@ -42,44 +76,62 @@ IAM_TOKEN = os.getenv('IAM_TOKEN')
 FOLDER_ID = os.getenv('FOLDER_ID')
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 
+# Единая база бота (вопросы, оценки, промпты)
+DB_PATH = os.getenv('DATABASE_PATH', 'bot.db')
+
+ALLOWED_UPDATES = ["message", "callback_query", "chat_member"]
+
 # Инициализация бота
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher(bot)
 scheduler = AsyncIOScheduler()
+gpt_client = YandexGPTClient(
+    iam_token=IAM_TOKEN,
+    folder_id=FOLDER_ID,
+    max_concurrency=CONFIG['llm_max_concurrency'],
+    timeout=CONFIG['llm_timeout']
+)
+storage = Storage(DB_PATH)
+admin_cache = ChatAdminCache(bot, ttl=CONFIG['admin_cache_ttl'] * 60)
+if CONFIG['redis_url']:
+    rate_limiter = RedisTokenBucketLimiter(CONFIG['redis_url'], CONFIG['max_questions_per_user'])
+else:
+    rate_limiter = TokenBucketLimiter(CONFIG['max_questions_per_user'])
+answer_cache = AnswerCache(
+    max_size=CONFIG['answer_cache_size'],
+    ttl=CONFIG['answer_cache_ttl'] * 3600,
+    similarity_threshold=CONFIG['answer_cache_similarity']
+)
+prompt_store = PromptStore(storage)
+prompt_store.subscribe(answer_cache.invalidate)
+knowledge_index = None
+
+
+def rebuild_knowledge_index(prompt_version: int):
+    """Переиндексирует данные промпта после загрузки его новой версии"""
+    global knowledge_index
+    if CONFIG['rag_top_k'] <= 0:
+        return
+    knowledge_index = KnowledgeIndex(
+        prompt_store.current.content,
+        load_extra_sources(CONFIG['rag_extra_sources']),
+        top_k=CONFIG['rag_top_k'],
+        max_chars=CONFIG['rag_max_chars']
+    )
+    logger.info(f"Knowledge index rebuilt for prompt version {prompt_version}: {len(knowledge_index.chunks)} chunks")
+
+
+prompt_store.subscribe(rebuild_knowledge_index)
 
 # Инициализация базы данных
 def init_db():
-    if os.path.exists('questions.db'):
-        os.remove('questions.db')
-    
-    with closing(sqlite3.connect('questions.db')) as conn:
-        c = conn.cursor()
-        c.execute('''CREATE TABLE questions
-                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                     msg_id INTEGER,
-                     chat_id INTEGER,
-                     user_id INTEGER,
-                     question TEXT,
-                     timestamp DATETIME,
-                     answered BOOLEAN DEFAULT FALSE,
-                     topic_id INTEGER,
-                     admin_replied BOOLEAN DEFAULT FALSE)''')  # Добавлено поле для отметки ответа админа
-        c.execute('''CREATE TABLE users
-                    (user_id INTEGER PRIMARY KEY,
-                     last_question_time DATETIME,
-                     question_count INTEGER DEFAULT 0)''')
-        conn.commit()
-        logger.info("Database initialized")
+    """Создаёт/обновляет схему и переносит данные из старых файлов баз"""
+    storage.setup(migrate)
+    logger.info("Database initialized")
 
 init_db()
 
-def init_prompt_db():
-    with closing(sqlite3.connect('system_prompt.db')) as conn:
-        conn.execute('''CREATE TABLE IF NOT EXISTS prompts
-                      (id INTEGER PRIMARY KEY,
-                       content TEXT NOT NULL,
-                       updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-        
+def init_prompt_db(conn: sqlite3.Connection):
         # Добавляем дефолтный промпт, если таблица пуста
         if not conn.execute("SELECT 1 FROM prompts LIMIT 1").fetchone():
             default_prompt = '''Ты — официальный представитель приёмной комиссии ИРИТ-РТФ УрФУ. Твоя задача — профессионально и убедительно отвечать только на вопросы, связанные с поступлением в ИРИТ-РТФ, и активно продвигать его преимущества.
@@ -254,77 +306,32 @@ def init_prompt_db():
             conn.execute("INSERT INTO prompts (content) VALUES (?)", (default_prompt,))
             conn.commit()
 
-init_prompt_db()
-
-def init_feedback_db():
-    with closing(sqlite3.connect('feedback_log.db')) as conn:
-        conn.execute('''CREATE TABLE IF NOT EXISTS feedbacks
-                      (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                       message_id INTEGER NOT NULL,
-                       question_text TEXT NOT NULL,
-                       bot_answer TEXT NOT NULL,
-                       feedback TEXT NOT NULL,
-                       user_id INTEGER NOT NULL,
-                       timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-        conn.commit()
-        logger.info("Feedback database initialized")
-
-init_feedback_db()
-
-def init_questions_log_db():
-    with closing(sqlite3.connect('questions_log.db')) as conn:
-        conn.execute('''CREATE TABLE IF NOT EXISTS questions_log
-                      (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                       question TEXT NOT NULL,
-                       timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-        conn.commit()
-        logger.info("Questions log database initialized")
-
-init_questions_log_db()
-
-def load_system_prompt() -> str:
-    try:
-        with closing(sqlite3.connect('system_prompt.db')) as conn:
-            cursor = conn.execute("SELECT content FROM prompts ORDER BY id DESC LIMIT 1")
-            result = cursor.fetchone()
-            return result[0] if result else "Дефолтный промпт"
-    except Exception as e:
-        logger.error(f"Ошибка загрузки промпта: {e}")
-        return "Дефолтный промпт (ошибка)"
-    
-def get_answer(question: str) -> str:
+storage.setup(init_prompt_db)
+
+async def get_answer(question: str) -> str:
     try:
-        system_prompt = load_system_prompt()
-
-        prompt = {
-            "modelUri": f"gpt://{FOLDER_ID}/yandexgpt",
-            "completionOptions": {
-                "temperature": 0.3,
-                "maxTokens": 1000
-            },
-            "messages": [
-                {
-                    "role": "system",
-                    "text": system_prompt
-                },
-                {
-                    "role": "user",
-                    "text": question
-                }
-            ]
-        }
-
-        response = requests.post(
-            "https://llm.api.cloud.yandex.net/foundationModels/v1/completion",
-            headers={
-                "Authorization": f"Bearer {IAM_TOKEN}",
-                "Content-Type": "application/json"
-            },
-            json=prompt
-        ).json()
-
-        return response['result']['alternatives'][0]['message']['text']
-    except Exception as e:
+        prompt = prompt_store.current
+
+        with STAGE_SECONDS.time(handler="response", stage="cache_lookup"):
+            cached = answer_cache.get(question, prompt.version)
+        if cached is not None:
+            return cached
+
+        system_prompt = prompt.content
+        if knowledge_index is not None:
+            with STAGE_SECONDS.time(handler="response", stage="prompt_build"):
+                system_prompt = knowledge_index.build_prompt(question)
+
+        started = time.monotonic()
+        try:
+            answer = await gpt_client.complete(system_prompt, question)
+        finally:
+            STAGE_SECONDS.observe(time.monotonic() - started, handler="response", stage="llm")
+        await record_stats(stats.latency_statements((time.monotonic() - started) * 1000))
+        answer_cache.put(question, answer, prompt.version)
+        return answer
+    except YandexGPTError as e:
+        API_ERRORS.inc(api="yandexgpt")
         logger.error(f"Yandex API error: {str(e)}")
         return "Не удалось обработать запрос. Попробуйте позже."
 
@@ -338,157 +345,263 @@ def get_feedback_keyboard(message_id: int) -> InlineKeyboardMarkup:
     return keyboard
 
 
-def save_feedback_to_file(message_id: int, feedback: str, user_id: int, bot_answer: str):
+async def save_feedback_to_file(message_id: int, feedback: str, user_id: int, bot_answer: str):
     try:
-        # Получаем вопрос по message_id
-        result = db_execute("SELECT question FROM questions WHERE msg_id=?", (message_id,))
-        question_text = result[0][0] if result else "[вопрос не найден]"
-
-        # Сохраняем в базу данных
-        with closing(sqlite3.connect('feedback_log.db')) as conn:
-            conn.execute(
-                "INSERT INTO feedbacks (message_id, question_text, bot_answer, feedback, user_id) VALUES (?, ?, ?, ?, ?)",
-                (message_id, question_text, bot_answer, feedback, user_id)
-            )
-            conn.commit()
+        # Оценка ссылается на вопрос по ключу, текст вопроса не копируется
+        await storage.execute_batch([(
+            '''INSERT INTO feedbacks (question_id, message_id, bot_answer, feedback, user_id)
+            VALUES ((SELECT id FROM questions WHERE msg_id=? ORDER BY id DESC LIMIT 1), ?, ?, ?, ?)''',
+            (message_id, message_id, bot_answer, feedback, user_id)
+        )] + stats.feedback_statements(feedback))
 
         logger.info(f"Оценка сохранена: {'лайк' if feedback == '👍' else 'дизлайк'} на вопрос {message_id}")
     except Exception as e:
         logger.error(f"Ошибка записи оценки: {e}")
 
-def save_question_to_file(question: str):
-    """Сохраняет вопрос в лог"""
-    try:
-
-        # Сохраняем в базу данных
-        with closing(sqlite3.connect('questions_log.db')) as conn:
-            conn.execute(
-                "INSERT INTO questions_log (question) VALUES (?)",
-                (question,)
-            )
-            conn.commit()
-    except Exception as e:
-        logger.error(f"Failed to save question: {e}")
-
 
 async def send_delayed_response(chat_id: int, message_id: int, topic_id: int):
-    """Отправка ответа с задержкой"""
-    try:
-        # Проверяем, не ответил ли уже админ
-        result = db_execute(
-            "SELECT admin_replied FROM questions WHERE msg_id=?",
-            (message_id,)
-        )
-        
-        if result and result[0][0]:  # Если админ уже ответил
-            logger.info(f"Admin already replied to message {message_id}")
-            return
+    """Отправка ответа, когда подошло время отложенного ответа"""
+    with STAGE_SECONDS.time(handler="response", stage="total"):
+        return await _send_delayed_response(chat_id, message_id, topic_id)
 
-        # Получаем вопрос из базы
-        question = db_execute(
-            "SELECT question FROM questions WHERE msg_id=? AND answered=0",
-            (message_id,)
-        )
+async def _send_delayed_response(chat_id: int, message_id: int, topic_id: int):
+    cancelled = False
+    try:
+        # Получаем вопрос из базы и проверяем, не ответил ли уже админ
+        with STAGE_SECONDS.time(handler="response", stage="load_question"):
+            result = await db_execute(
+                "SELECT question, admin_replied FROM questions WHERE msg_id=? AND answered=0",
+                (message_id,)
+            )
         
-        if not question:
+        if not result:
             return
 
-        # Ждем указанное время
-        await asyncio.sleep(CONFIG['response_delay'] * 60)
-
-        # Проверяем еще раз перед отправкой
-        result = db_execute(
-            "SELECT admin_replied FROM questions WHERE msg_id=?",
-            (message_id,)
-        )
-        if result and result[0][0]:
+        question, admin_replied = result[0]
+        if admin_replied:  # Если админ уже ответил
+            logger.info(f"Admin already replied to message {message_id}")
             return
 
         # Получаем и отправляем ответ
-        answer = get_answer(question[0][0])
+        answer = await get_answer(question)
         
         if "Этот вопрос не относится" in answer:
+            OFFTOPIC_SKIPPED.inc()
             logger.info(f"Skipping answer for message {message_id} as it contains exclusion phrase")
             return 
         
         answer = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', answer)
         
-        sent_message = await bot.send_message(
-            chat_id=chat_id,
-            message_thread_id=topic_id,
-            text=answer,
-            reply_to_message_id=message_id,
-            parse_mode="HTML",
-            reply_markup=get_feedback_keyboard(message_id)
-        )
+        try:
+            with STAGE_SECONDS.time(handler="response", stage="send_message"):
+                sent_message = await bot.send_message(
+                    chat_id=chat_id,
+                    message_thread_id=topic_id,
+                    text=answer,
+                    reply_to_message_id=message_id,
+                    parse_mode="HTML",
+                    reply_markup=get_feedback_keyboard(message_id)
+                )
+        except TelegramAPIError:
+            API_ERRORS.inc(api="telegram")
+            raise
 
         # Помечаем как отвеченный
-        db_execute(
-            "UPDATE questions SET answered=1 WHERE msg_id=?",
-            (message_id,),
-            commit=True
-        )
+        with STAGE_SECONDS.time(handler="response", stage="mark_answered"):
+            await db_execute(
+                "UPDATE questions SET answered=1 WHERE msg_id=?",
+                (message_id,),
+                commit=True
+            )
         
         return answer  # Возвращаем ответ бота для сохранения в логе
+    except asyncio.CancelledError:
+        # Остановка бота посреди ответа: due_at остаётся, restore_pending_responses поднимет вопрос после запуска
+        cancelled = True
+        raise
     except Exception as e:
         logger.error(f"Response error: {e}")
         return None
+    finally:
+        # Задание выполнено (или ответа не будет) — после перезапуска его не нужно поднимать
+        if not cancelled:
+            await db_execute(
+                "UPDATE questions SET due_at=NULL WHERE msg_id=?",
+                (message_id,),
+                commit=True
+            )
+
+async def drop_response(chat_id: int, message_id: int, topic_id: int):
+    """Вопрос вытеснен из переполненной очереди — отвечать не будем"""
+    await db_execute(
+        "UPDATE questions SET due_at=NULL WHERE msg_id=?",
+        (message_id,),
+        commit=True
+    )
+
+answer_pool = AnswerWorkerPool(
+    send_delayed_response,
+    workers=CONFIG['answer_workers'],
+    max_depth=CONFIG['answer_queue_size'],
+    shed_policy=CONFIG['answer_shed_policy'],
+    on_shed=drop_response
+)
 
-def db_execute(query: str, params=(), commit: bool = False):
+def answer_priority(questions_used: float) -> int:
+    """0 — первый вопрос пользователя, 1 — обычный, 2 — пользователь близок к лимиту"""
+    if questions_used <= 1:
+        return 0
+    if questions_used >= CONFIG['max_questions_per_user'] * 0.8:
+        return 2
+    return 1
+
+def enqueue_response(chat_id: int, message_id: int, topic_id: int, priority: int):
+    """Время ответа подошло — передаём вопрос воркерам генерации"""
+    answer_pool.submit(
+        priority,
+        chat_id=chat_id,
+        message_id=message_id,
+        topic_id=topic_id
+    )
+
+delayed_queue = DelayedResponseQueue(enqueue_response)
+
+# Метрики для Prometheus (GET /metrics на METRICS_HOST:METRICS_PORT)
+metrics_registry = MetricsRegistry()
+STAGE_SECONDS = metrics_registry.histogram(
+    "bot_stage_duration_seconds",
+    "Время этапов обработки: handler=message — входящее сообщение, response — отложенный ответ",
+    labels=("handler", "stage")
+)
+RATE_LIMITED = metrics_registry.counter("bot_rate_limited_total", "Вопросы сверх лимита пользователя")
+OFFTOPIC_SKIPPED = metrics_registry.counter("bot_offtopic_skipped_total", "Ответы не по теме, которые не отправлены")
+API_ERRORS = metrics_registry.counter("bot_api_errors_total", "Ошибки внешних API", labels=("api",))
+metrics_registry.counter(
+    "bot_answer_cache_hits_total", "Ответы из кэша", labels=("kind",),
+    function=lambda: {("exact",): answer_cache.hits_exact, ("similar",): answer_cache.hits_similar}
+)
+metrics_registry.counter("bot_answer_cache_misses_total", "Промахи кэша ответов",
+                         function=lambda: answer_cache.misses)
+metrics_registry.gauge("bot_delayed_responses_pending", "Отложенные ответы, время которых не подошло",
+                       function=lambda: len(delayed_queue))
+metrics_registry.gauge("bot_answer_queue_depth", "Ответы в очереди воркеров", function=lambda: len(answer_pool))
+metrics_registry.gauge("bot_answer_workers_busy", "Занятые воркеры генерации ответов",
+                       function=lambda: answer_pool.stats()["busy_workers"])
+metrics_registry.counter("bot_answer_queue_shed_total", "Ответы, вытесненные из переполненной очереди",
+                         function=lambda: answer_pool.shed)
+metrics_server = None
+
+def log_queue_metrics():
+    queue_stats = answer_pool.stats()
+    logger.info(
+        f"Answer queue: depth {queue_stats['depth']}/{queue_stats['max_depth']}, "
+        f"busy {queue_stats['busy_workers']}/{queue_stats['workers']}, delayed {len(delayed_queue)}, "
+        f"processed {queue_stats['processed']}, shed {queue_stats['shed']}, "
+        f"wait p50 {queue_stats['wait_p50']:.2f}s p95 {queue_stats['wait_p95']:.2f}s"
+    )
+
+async def restore_pending_responses():
+    """Возвращает в очередь отложенные ответы, не отправленные до перезапуска"""
+    expired_before = time.time() - CONFIG['pending_max_age'] * 3600
+    await db_execute(
+        "UPDATE questions SET due_at=NULL WHERE due_at IS NOT NULL AND due_at < ?",
+        (expired_before,),
+        commit=True
+    )
+    pending = await db_execute(
+        "SELECT chat_id, msg_id, topic_id, due_at, user_id FROM questions WHERE due_at IS NOT NULL"
+    ) or []
+    for chat_id, message_id, topic_id, due_at, user_id in pending:
+        delayed_queue.schedule(
+            due_at,
+            chat_id=chat_id,
+            message_id=message_id,
+            topic_id=topic_id,
+            priority=answer_priority(await rate_limiter.usage(user_id))
+        )
+    logger.info(f"Restored {len(pending)} pending responses")
+
+async def db_execute(query: str, params=(), commit: bool = False):
     """Выполнение SQL запроса"""
     try:
-        with closing(sqlite3.connect('questions.db')) as conn:
-            conn.execute("PRAGMA foreign_keys = ON")
-            c = conn.cursor()
-            c.execute(query, params)
-            if commit:
-                conn.commit()
-            return c.fetchall()
+        if commit:
+            await storage.execute(query, params)
+            return []
+        return await storage.fetchall(query, params)
     except sqlite3.Error as e:
         logger.error(f"Database error: {e}")
         return None
 
-async def check_user_limit(user_id: int) -> bool:
-    """Проверка лимита вопросов"""
+async def record_stats(statements: list):
+    """Агрегаты для /stats; ошибка их записи не должна мешать ответу"""
     try:
-        result = db_execute(
-            "SELECT question_count FROM users WHERE user_id=?",
-            (user_id,)
-        )
-        return not (result and result[0][0] >= CONFIG['max_questions_per_user'])
+        await storage.execute_batch(statements)
+    except sqlite3.Error as e:
+        logger.error(f"Stats update error: {e}")
+
+async def save_rate_limits():
+    """Снимок лимитов пользователей в базу (для восстановления после перезапуска)"""
+    rows = rate_limiter.snapshot()
+    try:
+        await storage.transaction([
+            ("INSERT OR REPLACE INTO rate_limits (user_id, tokens, updated_at) VALUES (?, ?, ?)", row)
+            for row in rows
+        ] + [
+            # За окно любое ведро наполняется до краёв — такие строки restore всё равно пропускает
+            ("DELETE FROM rate_limits WHERE updated_at < ?", (time.time() - rate_limiter.window,))
+        ])
     except Exception as e:
-        logger.error(f"Limit check error: {e}")
-        return True
+        # Вёдра остаются помеченными и попадут в следующий снимок
+        logger.error(f"Rate limit snapshot error: {e}")
+        return
+    rate_limiter.saved(rows)
 
-def update_user_limit(user_id: int):
-    """Обновление счетчика вопросов"""
+async def restore_rate_limits():
+    rows = await db_execute("SELECT user_id, tokens, updated_at FROM rate_limits") or []
+    rate_limiter.restore(rows)
+
+async def save_question(message: types.Message, topic_id: int, due_at: float):
+    """Сохранение вопроса вместе с временем отложенного ответа"""
     try:
-        db_execute(
-            '''INSERT OR REPLACE INTO users 
-            (user_id, last_question_time, question_count)
-            VALUES (?, ?, COALESCE(
-                (SELECT question_count FROM users WHERE user_id=?) + 1, 1))''',
-            (user_id, datetime.now(), user_id),
-            commit=True
-        )
+        # Вместе с вопросом обновляются агрегаты для /stats (stats.py)
+        await storage.execute_batch([(
+            '''INSERT INTO questions
+            (msg_id, chat_id, user_id, question, topic_id, due_at)
+            VALUES (?, ?, ?, ?, ?, ?)''',
+            (message.message_id, message.chat.id, message.from_user.id, message.text, topic_id, due_at)
+        )] + stats.question_statements(message.text))
     except Exception as e:
-        logger.error(f"Limit update error: {e}")
+        logger.error(f"Failed to save question: {e}")
 
-def cleanup_database():
-    """Очистка старых записей"""
+async def cleanup_database():
+    """Обслуживание базы: вопросы хранятся как лог и не удаляются, из частых вопросов /stats уходят старые разовые"""
     try:
-        db_execute(
-            "DELETE FROM questions WHERE timestamp < ?",
-            (datetime.now() - timedelta(days=7),),
-            commit=True
-        )
+        await storage.execute_batch(stats.prune_statements(CONFIG['stats_question_ttl']))
+        await storage.flush()
+        await storage.fetchall("PRAGMA optimize")
+        await storage.fetchall("PRAGMA wal_checkpoint(TRUNCATE)")
         logger.info("Database cleanup completed")
     except Exception as e:
         logger.error(f"Cleanup error: {e}")
 
+@dp.message_handler(commands=['reload_prompt'])
+async def reload_prompt_command(message: types.Message):
+    """Принудительная перезагрузка системного промпта администратором"""
+    if not admin_cache.is_admin(message.chat.id, message.from_user.id):
+        return
+    changed = await prompt_store.reload(force=True)
+    await message.reply(
+        f"Промпт обновлён, версия {prompt_store.version}" if changed
+        else f"Промпт не изменился, версия {prompt_store.version}"
+    )
+
 @dp.message_handler(content_types=types.ContentTypes.TEXT)
 async def handle_message(message: types.Message):
     """Обработка входящих сообщений"""
+    with STAGE_SECONDS.time(handler="message", stage="total"):
+        await _handle_message(message)
+
+async def _handle_message(message: types.Message):
     try:
         # Проверяем чат и тему
         if message.chat.id != CONFIG['allowed_chat_id']:
@@ -500,10 +613,10 @@ async def handle_message(message: types.Message):
 
         # Если это ответ админа на сообщение
         if message.reply_to_message:
-            if await is_admin(message.chat.id, message.from_user.id):
+            if admin_cache.is_admin(message.chat.id, message.from_user.id):
                 # Помечаем, что админ ответил
-                db_execute(
-                    "UPDATE questions SET admin_replied=1 WHERE msg_id=?",
+                await db_execute(
+                    "UPDATE questions SET admin_replied=1, due_at=NULL WHERE msg_id=?",
                     (message.reply_to_message.message_id,),
                     commit=True
                 )
@@ -514,58 +627,52 @@ async def handle_message(message: types.Message):
         if message.from_user.is_bot:
             return
 
+        # Накопившиеся за время простоя вопросы старше PENDING_MAX_AGE уже неактуальны
+        if time.time() - message.date.timestamp() > CONFIG['pending_max_age'] * 3600:
+            logger.info(f"Ignoring stale message {message.message_id} from {message.date}")
+            return
+
         # Проверяем, содержит ли сообщение вопрос (знак "?")
         if '?' not in message.text:
             logger.info(f"Ignoring message without question mark: {message.text}")
             return
 
         # Проверяем лимит
-        if not await check_user_limit(message.from_user.id):
+        with STAGE_SECONDS.time(handler="message", stage="rate_limit"):
+            allowed = await rate_limiter.hit(message.from_user.id)
+        if not allowed:
+            RATE_LIMITED.inc()
             await message.reply(
                 f"🚫 Лимит ({CONFIG['max_questions_per_user']} вопросов/час) исчерпан!"
             )
             return
 
         # Сохраняем вопрос
-        db_execute(
-            '''INSERT INTO questions 
-            (msg_id, chat_id, user_id, question, timestamp, topic_id)
-            VALUES (?, ?, ?, ?, ?, ?)''',
-            (
-                message.message_id,
-                message.chat.id,
-                message.from_user.id,
-                message.text,
-                datetime.now(),
-                topic_id
-            ),
-            commit=True
-        )
-        
-        save_question_to_file(message.text) #сохраняем вопрос в лог
-
-        update_user_limit(message.from_user.id)
-
-        # Запускаем отложенный ответ
-        asyncio.create_task(
-            send_delayed_response(
+        due_at = time.time() + CONFIG['response_delay'] * 60
+        with STAGE_SECONDS.time(handler="message", stage="save_question"):
+            await save_question(message, topic_id, due_at)
+
+        # Ставим отложенный ответ в очередь
+        with STAGE_SECONDS.time(handler="message", stage="schedule"):
+            delayed_queue.schedule(
+                due_at,
                 chat_id=message.chat.id,
                 message_id=message.message_id,
-                topic_id=topic_id
+                topic_id=topic_id,
+                priority=answer_priority(await rate_limiter.usage(message.from_user.id))
             )
-        )
 
     except Exception as e:
         logger.error(f"Message handling error: {e}")
 
-async def is_admin(chat_id: int, user_id: int) -> bool:
-    """Проверка, является ли пользователь администратором"""
-    try:
-        admins = await bot.get_chat_administrators(chat_id)
-        return any(admin.user.id == user_id for admin in admins)
-    except Exception as e:
-        logger.error(f"Admin check error: {e}")
-        return False
+@dp.chat_member_handler()
+async def handle_chat_member(update: types.ChatMemberUpdated):
+    """Назначение/снятие администраторов сразу отражается в кэше"""
+    admin_cache.apply_member_update(
+        update.chat.id,
+        update.new_chat_member.user.id,
+        update.new_chat_member.status
+    )
 
 
 #Кнопка для обратной связи на ответ
@@ -579,7 +686,7 @@ async def handle_feedback(callback_query: types.CallbackQuery):
         # Получаем ответ бота из сообщения
         bot_answer = callback_query.message.text
 
-        save_feedback_to_file(int(msg_id), feedback_text, user_id, bot_answer)
+        await save_feedback_to_file(int(msg_id), feedback_text, user_id, bot_answer)
 
         await callback_query.answer("Спасибо за вашу оценку!", show_alert=False)
         await callback_query.message.edit_reply_markup(reply_markup=None)
@@ -590,7 +697,37 @@ async def handle_feedback(callback_query: types.CallbackQuery):
 
 async def on_startup(dp):
     """Действия при запуске бота"""
+    global metrics_server
+    if CONFIG['metrics_port']:
+        metrics_server = await start_http_server(metrics_registry, CONFIG['metrics_host'], CONFIG['metrics_port'])
     scheduler.start()
+    scheduler.add_job(
+        log_queue_metrics,
+        'interval',
+        minutes=CONFIG['metrics_log_interval']
+    )
+    await admin_cache.refresh(CONFIG['allowed_chat_id'])
+    scheduler.add_job(
+        admin_cache.refresh,
+        'interval',
+        minutes=CONFIG['admin_cache_ttl'],
+        args=[CONFIG['allowed_chat_id']]
+    )
+    await prompt_store.reload()
+    scheduler.add_job(
+        prompt_store.reload,
+        'interval',
+        seconds=CONFIG['prompt_reload_interval']
+    )
+    await restore_rate_limits()
+    scheduler.add_job(
+        save_rate_limits,
+        'interval',
+        seconds=CONFIG['rate_limit_snapshot_interval']
+    )
+    await restore_pending_responses()
+    answer_pool.start()
+    delayed_queue.start()
     scheduler.add_job(
         cleanup_database,
         'interval',
@@ -605,12 +742,26 @@ async def on_startup(dp):
         logger.error(f"Startup error: {e}")
         raise
 
+async def on_shutdown(dp):
+    """Действия при остановке бота"""
+    await delayed_queue.stop()
+    await answer_pool.stop(CONFIG['shutdown_timeout'])
+    await gpt_client.close()
+    await save_rate_limits()
+    if isinstance(rate_limiter, RedisTokenBucketLimiter):
+        await rate_limiter.close()
+    await storage.close()
+    if metrics_server is not None:
+        await metrics_server.cleanup()
+
 if __name__ == "__main__":
     try:
         executor.start_polling(
             dp,
-            skip_updates=True,
-            on_startup=on_startup
+            skip_updates=CONFIG['skip_updates'],
+            allowed_updates=ALLOWED_UPDATES,
+            on_startup=on_startup,
+            on_shutdown=on_shutdown
         )
     except Exception as e:
         logger.error(f"Critical error: {e}")
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import logging
+from typing import Callable, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROMPT = "Дефолтный промпт"
+
+
+class Prompt(NamedTuple):
+    version: int
+    content: str
+
+
+class PromptStore:
+    """Активный системный промпт в памяти.
+
+    Текст перечитывается из базы только при смене активной строки prompts
+    (её id или updated_at): по таймеру проверяется лёгкий запрос без
+    content, по команде администратора — принудительно. Каждая загрузка
+    нового текста увеличивает version; подписчики (кэш ответов и т.п.)
+    получают новую версию через subscribe.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.current = Prompt(0, DEFAULT_PROMPT)
+        self._row_key = None
+        self._listeners = []
+
+    @property
+    def version(self) -> int:
+        return self.current.version
+
+    def subscribe(self, listener: Callable[[int], None]):
+        self._listeners.append(listener)
+
+    async def reload(self, force: bool = False) -> bool:
+        """Перечитывает промпт, если он сменился; True — загружена новая версия"""
+        try:
+            row = await self.storage.fetchone("SELECT id, updated_at FROM prompts ORDER BY id DESC LIMIT 1")
+            if row is None or (row == self._row_key and not force):
+                return False
+
+            content_row = await self.storage.fetchone("SELECT content FROM prompts WHERE id=?", (row[0],))
+            if content_row is None:
+                return False
+            content = content_row[0]
+        except Exception as e:
+            logger.error(f"Ошибка загрузки промпта: {e}")
+            return False
+
+        self._row_key = row
+        if content == self.current.content:
+            return False
+
+        self.current = Prompt(self.current.version + 1, content)
+        logger.info(f"System prompt loaded: row {row[0]} ({row[1]}), version {self.current.version}")
+        for listener in self._listeners:
+            listener(self.current.version)
+        return True
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucketLimiter:
+    """Лимит вопросов на пользователя: token bucket в памяти процесса.
+
+    У каждого пользователя ведро на limit вопросов, которое равномерно
+    наполняется за window секунд (50 вопросов/час — это 50 сразу и далее
+    по одному каждые 72 секунды). Проверка — арифметика над словарём.
+    Состояние периодически сохраняется в таблицу rate_limits (snapshot,
+    после успешной записи — saved) и поднимается из неё при старте
+    (restore). Наполнившиеся до краёв вёдра из памяти удаляются: такое
+    ведро ничем не отличается от отсутствующего.
+    """
+
+    def __init__(self, limit: int, window: float = 3600):
+        self.limit = limit
+        self.window = window
+        self.rate = limit / window
+        self._buckets = {}
+        self._dirty = set()
+
+    def _tokens(self, user_id: int, now: float) -> float:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            return float(self.limit)
+        tokens, updated_at = bucket
+        return min(self.limit, tokens + (now - updated_at) * self.rate)
+
+    async def hit(self, user_id: int) -> bool:
+        """Списывает один вопрос; False, если лимит исчерпан"""
+        now = time.time()
+        tokens = self._tokens(user_id, now)
+        if tokens < 1:
+            return False
+        self._buckets[user_id] = (tokens - 1, now)
+        self._dirty.add(user_id)
+        return True
+
+    async def usage(self, user_id: int) -> float:
+        """Сколько вопросов пользователь задал в текущем окне (приблизительно)"""
+        return self.limit - self._tokens(user_id, time.time())
+
+    def snapshot(self) -> list:
+        """Изменившиеся с прошлой записи вёдра: [(user_id, tokens, updated_at)]"""
+        return [(user_id, *self._buckets[user_id]) for user_id in self._dirty]
+
+    def saved(self, rows):
+        """Снимок записан в базу: вёдра, не менявшиеся с него, больше не нужно сохранять"""
+        for user_id, tokens, updated_at in rows:
+            if self._buckets.get(user_id) == (tokens, updated_at):
+                self._dirty.discard(user_id)
+        now = time.time()
+        full = [user_id for user_id in self._buckets if self._tokens(user_id, now) >= self.limit]
+        for user_id in full:
+            del self._buckets[user_id]
+            self._dirty.discard(user_id)
+
+    def restore(self, rows):
+        now = time.time()
+        for user_id, tokens, updated_at in rows:
+            if now - updated_at < self.window:
+                self._buckets[user_id] = (tokens, updated_at)
+
+
+class RedisTokenBucketLimiter:
+    """Тот же token bucket в Redis — общий лимит для нескольких реплик бота"""
+
+    # Атомарно пополняет и списывает ведро; возвращает {разрешено, остаток}
+    _SCRIPT = """
+local limit = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or limit
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(limit, tokens + (now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+if cost > 0 then
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(limit / rate))
+end
+return {allowed, tostring(tokens)}
+"""
+
+    def __init__(self, url: str, limit: int, window: float = 3600, prefix: str = "ratelimit:"):
+        import redis.asyncio as redis  # опциональная зависимость
+
+        self.limit = limit
+        self.window = window
+        self.rate = limit / window
+        self.prefix = prefix
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(self._SCRIPT)
+
+    async def _call(self, user_id: int, cost: int):
+        allowed, tokens = await self._script(
+            keys=[f"{self.prefix}{user_id}"],
+            args=[self.limit, self.rate, time.time(), cost]
+        )
+        return bool(allowed), float(tokens)
+
+    async def hit(self, user_id: int) -> bool:
+        allowed, _ = await self._call(user_id, 1)
+        return allowed
+
+    async def usage(self, user_id: int) -> float:
+        _, tokens = await self._call(user_id, 0)
+        return self.limit - tokens
+
+    def snapshot(self) -> list:
+        return []  # состояние и так хранится в Redis
+
+    def saved(self, rows):
+        pass
+
+    def restore(self, rows):
+        pass
+
+    async def close(self):
+        await self._redis.close()
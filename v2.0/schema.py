@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import sqlite3
+
+import stats
+from storage import execute_script
+
+logger = logging.getLogger(__name__)
+
+# Старые базы, данные из которых переносятся при первом запуске
+LEGACY_DATABASES = {
+    "prompts_db": "system_prompt.db",
+    "questions_log_db": "questions_log.db",
+    "feedback_db": "feedback_log.db",
+}
+
+
+def _create_schema(conn: sqlite3.Connection):
+    execute_script(conn, '''
+        CREATE TABLE questions
+            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+             msg_id INTEGER,
+             chat_id INTEGER,
+             user_id INTEGER,
+             question TEXT NOT NULL,
+             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+             answered BOOLEAN DEFAULT FALSE,
+             topic_id INTEGER,
+             admin_replied BOOLEAN DEFAULT FALSE);
+        CREATE INDEX idx_questions_msg_id ON questions (msg_id);
+        CREATE INDEX idx_questions_user_id ON questions (user_id);
+        CREATE INDEX idx_questions_timestamp ON questions (timestamp);
+
+        CREATE TABLE users
+            (user_id INTEGER PRIMARY KEY,
+             last_question_time DATETIME,
+             question_count INTEGER DEFAULT 0);
+
+        CREATE TABLE prompts
+            (id INTEGER PRIMARY KEY,
+             content TEXT NOT NULL,
+             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+
+        CREATE TABLE feedbacks
+            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+             question_id INTEGER REFERENCES questions (id) ON DELETE SET NULL,
+             message_id INTEGER NOT NULL,
+             bot_answer TEXT NOT NULL,
+             feedback TEXT NOT NULL,
+             user_id INTEGER NOT NULL,
+             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        CREATE INDEX idx_feedbacks_question_id ON feedbacks (question_id);
+        CREATE INDEX idx_feedbacks_user_id ON feedbacks (user_id);
+        CREATE INDEX idx_feedbacks_timestamp ON feedbacks (timestamp);
+
+        -- Представления в формате старых questions_log.db и feedback_log.db (для выгрузок)
+        CREATE VIEW questions_log AS
+            SELECT id, question, timestamp FROM questions;
+        CREATE VIEW feedback_log AS
+            SELECT f.id, f.message_id,
+                   COALESCE(q.question, '[вопрос не найден]') AS question_text,
+                   f.bot_answer, f.feedback, f.user_id, f.timestamp
+            FROM feedbacks f LEFT JOIN questions q ON q.id = f.question_id;
+    ''')
+
+
+def _import_legacy(conn: sqlite3.Connection, directory: str):
+    """Переносит данные из отдельных файлов баз предыдущей версии.
+
+    Базы подключаются через ATTACH внутри транзакции миграции; отключает их
+    migrate() после коммита (DETACH в открытой транзакции SQLite запрещает).
+    """
+    for alias, filename in LEGACY_DATABASES.items():
+        path = os.path.join(directory, filename)
+        if not os.path.exists(path):
+            continue
+        conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+        tables = {row[0] for row in conn.execute(f"SELECT name FROM {alias}.sqlite_master WHERE type='table'")}
+
+        if alias == "prompts_db" and "prompts" in tables:
+            conn.execute('''INSERT INTO prompts (id, content, updated_at)
+                            SELECT id, content, updated_at FROM prompts_db.prompts''')
+        elif alias == "questions_log_db" and "questions_log" in tables:
+            # id сохраняются, чтобы не задвоить уже выгруженные строки questions_history.csv
+            conn.execute('''INSERT INTO questions (id, question, timestamp)
+                            SELECT id, question, timestamp FROM questions_log_db.questions_log''')
+        elif alias == "feedback_db" and "feedbacks" in tables:
+            # Вопросы, которых нет в логе, добавляем, чтобы не потерять их текст
+            conn.execute('''INSERT INTO questions (msg_id, question, timestamp)
+                            SELECT f.message_id, f.question_text, f.timestamp
+                            FROM feedback_db.feedbacks f
+                            WHERE f.question_text != '[вопрос не найден]'
+                              AND NOT EXISTS (SELECT 1 FROM questions q WHERE q.question = f.question_text)''')
+            conn.execute('''INSERT INTO feedbacks (id, question_id, message_id, bot_answer, feedback, user_id, timestamp)
+                            SELECT f.id,
+                                   (SELECT q.id FROM questions q
+                                    WHERE q.question = f.question_text AND q.timestamp <= f.timestamp
+                                    ORDER BY q.timestamp DESC LIMIT 1),
+                                   f.message_id, f.bot_answer, f.feedback, f.user_id, f.timestamp
+                            FROM feedback_db.feedbacks f''')
+            conn.execute('''UPDATE feedbacks SET question_id =
+                                (SELECT q.id FROM questions q, feedback_db.feedbacks f
+                                 WHERE f.id = feedbacks.id AND q.question = f.question_text
+                                 ORDER BY q.id LIMIT 1)
+                            WHERE question_id IS NULL''')
+        logger.info(f"Imported legacy database {filename}")
+
+
+def _migration_1(conn: sqlite3.Connection, directory: str):
+    _create_schema(conn)
+    _import_legacy(conn, directory)
+
+
+def _migration_2(conn: sqlite3.Connection, directory: str):
+    # Время отложенного ответа (unix time); NULL — ответ не ожидается
+    execute_script(conn, '''
+        ALTER TABLE questions ADD COLUMN due_at REAL;
+        CREATE INDEX idx_questions_due_at ON questions (due_at) WHERE due_at IS NOT NULL;
+    ''')
+
+
+def _migration_3(conn: sqlite3.Connection, directory: str):
+    # Счётчик users заменён token bucket'ом в памяти; здесь только его снимки
+    execute_script(conn, '''
+        DROP TABLE users;
+        CREATE TABLE rate_limits
+            (user_id INTEGER PRIMARY KEY,
+             tokens REAL NOT NULL,
+             updated_at REAL NOT NULL);
+    ''')
+
+
+def _migration_4(conn: sqlite3.Connection, directory: str):
+    # updated_at меняется при любой правке текста — по нему бот замечает новую версию промпта
+    execute_script(conn, '''
+        CREATE TRIGGER prompts_touch_updated_at AFTER UPDATE OF content ON prompts
+        BEGIN
+            UPDATE prompts SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+        END;
+    ''')
+
+
+def _migration_5(conn: sqlite3.Connection, directory: str):
+    # Агрегаты для /stats (stats.py), заполняются по уже накопленной истории
+    stats.create_tables(conn)
+    stats.backfill(conn)
+
+
+# Миграции по порядку: версия схемы = номер последней применённой (PRAGMA user_version)
+MIGRATIONS = [
+    _migration_1,
+    _migration_2,
+    _migration_3,
+    _migration_4,
+    _migration_5,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def _detach_all(conn: sqlite3.Connection):
+    for _, name, _ in conn.execute("PRAGMA database_list").fetchall():
+        if name not in ("main", "temp"):
+            conn.execute(f"DETACH DATABASE {name}")
+
+
+def migrate(conn: sqlite3.Connection, legacy_directory: str = "."):
+    """Доводит схему базы до последней версии.
+
+    Каждая миграция вместе с новым user_version — одна транзакция: упавшая
+    миграция откатывается целиком и при следующем запуске выполняется заново.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute("BEGIN")
+        try:
+            migration(conn, legacy_directory)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            _detach_all(conn)
+        logger.info(f"Database schema migrated to version {number}")
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import os
+import signal
+
+import main
+import admin_bot
+from webhook import WebhookBot, serve
+
+logger = logging.getLogger(__name__)
+
+# Основной бот и админ-бот в одном процессе.
+#
+# BOT_MODE=webhook — оба бота за одним HTTP-сервером (webhook.py): Telegram
+# шлёт апдейты на WEBHOOK_URL + /webhook/main и /webhook/admin, у ботов
+# свои очереди и воркеры. BOT_MODE=polling — long polling обоих ботов.
+# Апдейты, пришедшие, пока бот был остановлен, обрабатываются, если не
+# задан SKIP_UPDATES=1.
+#
+#     BOT_MODE=webhook WEBHOOK_URL=https://bot.example.com python server.py
+
+CONFIG = {
+    "mode": os.getenv('BOT_MODE', 'polling'),  # polling или webhook
+    "webhook_url": os.getenv('WEBHOOK_URL'),  # внешний https-адрес, на который Telegram шлёт апдейты
+    "webhook_host": os.getenv('WEBHOOK_HOST', '0.0.0.0'),
+    "webhook_port": int(os.getenv('WEBHOOK_PORT', 8080)),
+    "webhook_secret": os.getenv('WEBHOOK_SECRET'),  # A-Z, a-z, 0-9, _ и -; если не задан — новый при каждом запуске
+    "webhook_workers": int(os.getenv('WEBHOOK_WORKERS', 8)),  # обработчиков апдейтов на бота
+    "webhook_queue_size": int(os.getenv('WEBHOOK_QUEUE_SIZE', 100)),  # апдейтов в очереди; сверх — 503 и повтор от Telegram
+}
+
+
+def build_webhook_bots() -> list:
+    common = dict(secret=CONFIG['webhook_secret'], workers=CONFIG['webhook_workers'],
+                  queue_size=CONFIG['webhook_queue_size'])
+    return [
+        WebhookBot(main.dp, "/webhook/main", allowed_updates=main.ALLOWED_UPDATES,
+                   on_startup=main.on_startup, on_shutdown=main.on_shutdown, **common),
+        WebhookBot(admin_bot.dp, "/webhook/admin", **common),
+    ]
+
+
+async def run_webhook(stop_event: asyncio.Event):
+    if not CONFIG['webhook_url']:
+        raise RuntimeError("WEBHOOK_URL is required in webhook mode")
+    bots = build_webhook_bots()
+    main.metrics_registry.gauge(
+        "bot_webhook_queue_depth", "Апдейты в очереди вебхука", labels=("bot",),
+        function=lambda: {(webhook_bot.path,): len(webhook_bot) for webhook_bot in bots}
+    )
+    main.metrics_registry.counter(
+        "bot_webhook_rejected_total", "Апдейты, не принятые из-за полной очереди (Telegram доставит повторно)",
+        labels=("bot",), function=lambda: {(webhook_bot.path,): webhook_bot.rejected for webhook_bot in bots}
+    )
+    await serve(bots, CONFIG['webhook_url'], CONFIG['webhook_host'], CONFIG['webhook_port'], stop_event,
+                drop_pending_updates=main.CONFIG['skip_updates'])
+
+
+async def run_polling(stop_event: asyncio.Event):
+    await main.on_startup(main.dp)
+    try:
+        if main.CONFIG['skip_updates']:
+            for dp in (main.dp, admin_bot.dp):
+                await dp.skip_updates()
+        tasks = [
+            asyncio.create_task(main.dp.start_polling(allowed_updates=main.ALLOWED_UPDATES)),
+            asyncio.create_task(admin_bot.dp.start_polling()),
+        ]
+        await stop_event.wait()
+        # Отмена прерывает и текущий долгий getUpdates, не дожидаясь его таймаута
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await main.on_shutdown(main.dp)
+        for dp in (main.dp, admin_bot.dp):
+            await (await dp.bot.get_session()).close()
+
+
+async def run():
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    try:
+        if CONFIG['mode'] == 'webhook':
+            await run_webhook(stop_event)
+        elif CONFIG['mode'] == 'polling':
+            await run_polling(stop_event)
+        else:
+            raise RuntimeError(f"Unknown BOT_MODE: {CONFIG['mode']}")
+    finally:
+        if main.scheduler.running:
+            main.scheduler.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run())
+    except Exception as e:
+        logger.error(f"Critical error: {e}")
+    finally:
+        logger.info("Боты остановлены")
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+import re
+import sqlite3
+import time
+from typing import List, Optional, Tuple
+
+from storage import execute_script
+
+# Агрегаты для /stats админ-бота.
+#
+# Счётчики обновляются при записи: вместе с вопросом, оценкой или ответом
+# модели в базу уходят UPSERT'ы в маленькие таблицы (stats_hourly,
+# stats_daily, stats_latency, stats_top_questions). Отчёт читает только их и
+# не сканирует questions и feedbacks. Время — UTC, как CURRENT_TIMESTAMP.
+# Разовые вопросы, которые давно не повторялись, удаляются при обслуживании
+# базы (prune_statements), иначе stats_top_questions растёт с каждым новым текстом.
+
+# Верхние границы корзин задержки модели, мс; всё дольше — в последнюю корзину
+LATENCY_BUCKETS_MS = (250, 500, 750, 1000, 1500, 2000, 3000, 4000, 5000, 7500, 10000, 15000, 20000, 30000, 60000)
+TOP_QUESTIONS = 10
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]+")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Ключ повторяющегося вопроса: регистр, ё, пунктуация и пробелы не различаются"""
+    text = _PUNCTUATION_RE.sub(" ", str(question).lower().replace("ё", "е"))
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+def latency_bucket(latency_ms: float) -> int:
+    for i, bound in enumerate(LATENCY_BUCKETS_MS):
+        if latency_ms <= bound:
+            return i
+    return len(LATENCY_BUCKETS_MS)
+
+
+def _periods(now: Optional[float]) -> Tuple[str, str, str]:
+    moment = time.gmtime(now)
+    return (time.strftime("%Y-%m-%d %H:00", moment), time.strftime("%Y-%m-%d", moment),
+            time.strftime("%Y-%m-%d %H:%M:%S", moment))
+
+
+def _increment(hour: str, day: str, column: str, value: int = 1) -> list:
+    return [
+        (f"INSERT INTO stats_hourly (hour, {column}) VALUES (?, ?) "
+         f"ON CONFLICT(hour) DO UPDATE SET {column} = {column} + excluded.{column}", (hour, value)),
+        (f"INSERT INTO stats_daily (day, {column}) VALUES (?, ?) "
+         f"ON CONFLICT(day) DO UPDATE SET {column} = {column} + excluded.{column}", (day, value)),
+    ]
+
+
+def question_statements(question: str, now: Optional[float] = None) -> list:
+    """Изменения агрегатов для нового вопроса"""
+    hour, day, timestamp = _periods(now)
+    statements = _increment(hour, day, "questions")
+    key = normalize_question(question)
+    if key:  # сообщения из одних знаков («?») в частые вопросы не попадают
+        statements.append((
+            '''INSERT INTO stats_top_questions (question_key, question, count, last_seen) VALUES (?, ?, 1, ?)
+               ON CONFLICT(question_key) DO UPDATE SET count = count + 1,
+                   question = excluded.question, last_seen = excluded.last_seen''',
+            (key, question, timestamp)
+        ))
+    return statements
+
+
+def feedback_statements(feedback: str, now: Optional[float] = None) -> list:
+    """Изменения агрегатов для оценки 👍/👎"""
+    hour, day, _ = _periods(now)
+    return _increment(hour, day, "likes" if feedback == "👍" else "dislikes")
+
+
+def latency_statements(latency_ms: float, now: Optional[float] = None) -> list:
+    """Изменения агрегатов для ответа модели"""
+    hour, day, _ = _periods(now)
+    return (
+        _increment(hour, day, "llm_calls")
+        + _increment(hour, day, "llm_latency_ms", int(latency_ms))
+        + [('''INSERT INTO stats_latency (day, bucket, count) VALUES (?, ?, 1)
+               ON CONFLICT(day, bucket) DO UPDATE SET count = count + 1''', (day, latency_bucket(latency_ms)))]
+    )
+
+
+def prune_statements(max_age_days: float, now: Optional[float] = None) -> list:
+    """Удаление вопросов, заданных один раз и не повторявшихся max_age_days дней"""
+    now = time.time() if now is None else now
+    cutoff = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now - max_age_days * 86400))
+    return [("DELETE FROM stats_top_questions WHERE count = 1 AND last_seen < ?", (cutoff,))]
+
+
+def create_tables(conn: sqlite3.Connection):
+    execute_script(conn, '''
+        CREATE TABLE stats_hourly
+            (hour TEXT PRIMARY KEY,
+             questions INTEGER NOT NULL DEFAULT 0,
+             likes INTEGER NOT NULL DEFAULT 0,
+             dislikes INTEGER NOT NULL DEFAULT 0,
+             llm_calls INTEGER NOT NULL DEFAULT 0,
+             llm_latency_ms INTEGER NOT NULL DEFAULT 0);
+        CREATE TABLE stats_daily
+            (day TEXT PRIMARY KEY,
+             questions INTEGER NOT NULL DEFAULT 0,
+             likes INTEGER NOT NULL DEFAULT 0,
+             dislikes INTEGER NOT NULL DEFAULT 0,
+             llm_calls INTEGER NOT NULL DEFAULT 0,
+             llm_latency_ms INTEGER NOT NULL DEFAULT 0);
+        CREATE TABLE stats_latency
+            (day TEXT NOT NULL,
+             bucket INTEGER NOT NULL,
+             count INTEGER NOT NULL DEFAULT 0,
+             PRIMARY KEY (day, bucket));
+        CREATE TABLE stats_top_questions
+            (question_key TEXT PRIMARY KEY,
+             question TEXT NOT NULL,
+             count INTEGER NOT NULL DEFAULT 0,
+             last_seen TIMESTAMP);
+        CREATE INDEX idx_stats_top_questions_count ON stats_top_questions (count);
+    ''')
+
+
+def backfill(conn: sqlite3.Connection):
+    """Один раз заполняет агрегаты по уже накопленным вопросам и оценкам (задержек в истории нет)"""
+    for table, period, length in (("stats_hourly", "hour", 13), ("stats_daily", "day", 10)):
+        suffix = ":00" if period == "hour" else ""
+        conn.execute(f'''INSERT INTO {table} ({period}, questions)
+                         SELECT substr(timestamp, 1, {length}) || '{suffix}', COUNT(*) FROM questions
+                         WHERE timestamp IS NOT NULL GROUP BY 1''')
+        conn.execute(f'''INSERT INTO {table} ({period}, likes, dislikes)
+                         SELECT substr(timestamp, 1, {length}) || '{suffix}',
+                                SUM(feedback = '👍'), SUM(feedback = '👎') FROM feedbacks
+                         WHERE timestamp IS NOT NULL GROUP BY 1
+                         ON CONFLICT({period}) DO UPDATE SET likes = excluded.likes, dislikes = excluded.dislikes''')
+
+    top = {}
+    for question, timestamp in conn.execute("SELECT question, timestamp FROM questions ORDER BY id"):
+        key = normalize_question(question)
+        if not key:
+            continue
+        count = top[key][1] + 1 if key in top else 1
+        top[key] = (question, count, timestamp)
+    conn.executemany(
+        "INSERT INTO stats_top_questions (question_key, question, count, last_seen) VALUES (?, ?, ?, ?)",
+        [(key, question, count, timestamp) for key, (question, count, timestamp) in top.items()]
+    )
+
+
+def _percentile(histogram: List[int], fraction: float) -> Optional[str]:
+    total = sum(histogram)
+    if not total:
+        return None
+    seen = 0
+    for i, count in enumerate(histogram):
+        seen += count
+        if seen >= fraction * total:
+            return f"≤{LATENCY_BUCKETS_MS[i]} мс" if i < len(LATENCY_BUCKETS_MS) else f">{LATENCY_BUCKETS_MS[-1]} мс"
+
+
+def report(conn: sqlite3.Connection, now: Optional[float] = None) -> str:
+    """Текст /stats: только агрегатные таблицы, десятки строк"""
+    current_hour, today, _ = _periods(now)
+    now = time.time() if now is None else now
+    lines = ["📊 Статистика (UTC)"]
+
+    for title, days in (("Сегодня", 1), ("7 дней", 7), ("30 дней", 30)):
+        since = time.strftime("%Y-%m-%d", time.gmtime(now - (days - 1) * 86400))
+        questions, likes, dislikes, calls, latency = conn.execute(
+            '''SELECT COALESCE(SUM(questions), 0), COALESCE(SUM(likes), 0), COALESCE(SUM(dislikes), 0),
+                      COALESCE(SUM(llm_calls), 0), COALESCE(SUM(llm_latency_ms), 0)
+               FROM stats_daily WHERE day BETWEEN ? AND ?''', (since, today)
+        ).fetchone()
+        rated = likes + dislikes
+        rate = f"{likes / rated:.0%} 👍" if rated else "нет оценок"
+        average = f", среднее время модели {latency / calls / 1000:.1f} с" if calls else ""
+        lines.append(f"{title}: вопросов {questions}, оценок {rated} ({rate}){average}")
+
+    since_hour = time.strftime("%Y-%m-%d %H:00", time.gmtime(now - 23 * 3600))
+    hourly = conn.execute("SELECT hour, questions FROM stats_hourly WHERE hour BETWEEN ? AND ? ORDER BY hour",
+                          (since_hour, current_hour)).fetchall()
+    if hourly:
+        lines.append("Вопросы по часам за сутки: " + ", ".join(f"{hour[11:13]}ч — {count}" for hour, count in hourly))
+
+    since_week = time.strftime("%Y-%m-%d", time.gmtime(now - 6 * 86400))
+    histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    for bucket, count in conn.execute(
+            "SELECT bucket, SUM(count) FROM stats_latency WHERE day BETWEEN ? AND ? GROUP BY bucket",
+            (since_week, today)):
+        histogram[bucket] += count
+    if sum(histogram):
+        lines.append("Время ответа модели за 7 дней: " + ", ".join(
+            f"p{int(fraction * 100)} {_percentile(histogram, fraction)}" for fraction in (0.5, 0.9, 0.99)
+        ))
+
+    top = conn.execute(
+        "SELECT question, count FROM stats_top_questions WHERE count > 1 ORDER BY count DESC LIMIT ?",
+        (TOP_QUESTIONS,)
+    ).fetchall()
+    if top:
+        lines.append("Частые вопросы:")
+        lines.extend(f"{count} × {question[:100]}" for question, count in top)
+    return "\n".join(lines)
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def execute_script(conn: sqlite3.Connection, script: str):
+    """Как executescript, но без его неявного COMMIT: операторы выполняются в текущей транзакции"""
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+    if statement.strip():
+        conn.execute(statement)
+
+
+def _resolve(waiter: asyncio.Future, error: Optional[Exception]):
+    if waiter.done():  # вызывающий мог быть отменён
+        return
+    if error is None:
+        waiter.set_result(None)
+    else:
+        waiter.set_exception(error)
+
+
+class Storage:
+    """Долгоживущее соединение с базой бота.
+
+    Открывается одно соединение (WAL, synchronous=NORMAL), скомпилированные
+    запросы переиспользуются через кэш statement'ов sqlite3. Вся работа
+    с базой идёт в одном выделенном потоке, чтобы не блокировать event loop.
+    Записи не коммитятся по одной: транзакция закрывается раз в
+    commit_interval секунд или после max_pending изменений. execute и
+    execute_batch возвращаются после коммита своей пачки; если коммит
+    не удался, его изменения откатываются и ошибку получают все, кто их ждал.
+    """
+
+    def __init__(self, path: str, commit_interval: float = 0.05, max_pending: int = 100):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage")
+        self._conn = None
+        # (loop, future) записей, ещё не закоммиченных; меняется только в потоке базы
+        self._pending = []
+        self._flush_handle = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.execute("PRAGMA busy_timeout = 5000")
+            self._conn = conn
+        return self._conn
+
+    def _commit_all(self) -> Optional[sqlite3.Error]:
+        """Коммит накопленного; результат получают все ожидающие записи"""
+        pending, self._pending = self._pending, []
+        error = None
+        if self._conn is not None and self._conn.in_transaction:
+            try:
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Commit error: {e}")
+                error = e
+                try:
+                    self._conn.rollback()
+                except sqlite3.Error:
+                    pass
+        for loop, waiter in pending:
+            loop.call_soon_threadsafe(_resolve, waiter, error)
+        return error
+
+    def _track(self, waiter):
+        self._pending.append(waiter)
+        if len(self._pending) >= self.max_pending:
+            self._commit_all()
+
+    def _execute(self, query: str, params, waiter=None):
+        cursor = self._connect().execute(query, params)
+        if waiter is None:
+            return cursor.fetchall()
+        self._track(waiter)
+        return cursor.rowcount
+
+    def _execute_batch(self, statements, waiter):
+        conn = self._connect()
+        # Пачка атомарна: при ошибке откатываются только её операторы, а не чужие незакоммиченные.
+        # Точка сохранения вложена в открытую транзакцию, иначе RELEASE сразу закоммитил бы её
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        conn.execute("SAVEPOINT batch")
+        try:
+            for query, params in statements:
+                conn.execute(query, params)
+        except BaseException:
+            conn.execute("ROLLBACK TO batch")
+            conn.execute("RELEASE batch")
+            raise
+        conn.execute("RELEASE batch")
+        self._track(waiter)
+
+    def _schedule_flush(self):
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.commit_interval, self._flush_later)
+
+    def _flush_later(self):
+        self._flush_handle = None
+        # Ошибку коммита получат ожидающие записи (_commit_all), здесь её не ждём
+        asyncio.get_running_loop().run_in_executor(self._executor, self._commit_all)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _write(self, func, *args):
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        result = await self._run(func, *args, (loop, waiter))
+        self._schedule_flush()
+        await waiter
+        return result
+
+    def setup(self, func):
+        """Синхронно выполняет func(conn) в потоке базы (миграции при запуске)"""
+        return self._executor.submit(lambda: func(self._connect())).result()
+
+    async def fetchall(self, query: str, params=()) -> list:
+        return await self._run(self._execute, query, params)
+
+    async def fetchone(self, query: str, params=()):
+        rows = await self.fetchall(query, params)
+        return rows[0] if rows else None
+
+    async def execute(self, query: str, params=()) -> int:
+        """Изменение данных; возвращается после коммита ближайшей пачки"""
+        return await self._write(self._execute, query, params)
+
+    async def execute_batch(self, statements: list):
+        """Несколько изменений атомарно, за один переход в поток базы; возвращается после коммита пачки"""
+        await self._write(self._execute_batch, statements)
+
+    async def transaction(self, statements: list):
+        """Несколько изменений атомарно, коммит сразу (вместе с уже накопленной пачкой)"""
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        await self._run(self._execute_batch, statements, (loop, waiter))
+        await self.flush()
+        await waiter
+
+    async def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        error = await self._run(self._commit_all)
+        if error is not None:
+            raise error
+
+    async def close(self):
+        def close_connection():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+        try:
+            await self.flush()
+        finally:
+            await self._run(close_connection)
+            self._executor.shutdown(wait=True)
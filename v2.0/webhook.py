@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import hmac
+import logging
+import secrets
+from typing import Awaitable, Callable, List, Optional
+
+from aiogram import Bot, Dispatcher, types
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Приём апдейтов Telegram через вебхук.
+#
+# Один aiohttp-сервер обслуживает несколько ботов: у каждого свой путь и
+# секрет, который Telegram присылает в заголовке X-Telegram-Bot-Api-Secret-Token
+# (запрос с другим секретом получает 403). Принятый апдейт кладётся в
+# ограниченную очередь бота, Telegram сразу получает 200, а обрабатывают
+# очередь workers задач. Если очередь полна, ответ 503: Telegram повторит
+# доставку позже, апдейт не теряется. Пока бот остановлен, Telegram копит
+# апдейты у себя и отдаёт их после запуска (если не drop_pending_updates).
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookBot:
+    """Диспетчер aiogram за общим вебхук-сервером"""
+
+    def __init__(self, dispatcher: Dispatcher, path: str, secret: Optional[str] = None,
+                 workers: int = 8, queue_size: int = 100, allowed_updates: Optional[List[str]] = None,
+                 on_startup: Optional[Callable[[Dispatcher], Awaitable]] = None,
+                 on_shutdown: Optional[Callable[[Dispatcher], Awaitable]] = None):
+        self.dispatcher = dispatcher
+        self.path = path
+        # Без заданного секрета — новый при каждом запуске: вебхук всё равно переустанавливается при старте
+        self.secret = secret or secrets.token_urlsafe(32)
+        self.workers = workers
+        self.queue_size = queue_size
+        self.allowed_updates = allowed_updates
+        self.on_startup = on_startup
+        self.on_shutdown = on_shutdown
+        self._queue = None
+        self._tasks = []
+        self.rejected = 0
+
+    def __len__(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token.encode(), self.secret.encode()):
+            logger.warning(f"Webhook {self.path}: wrong secret token from {request.remote}")
+            return web.Response(status=403)
+        if self._queue is None:
+            return web.Response(status=503)
+        try:
+            update = types.Update.to_object(await request.json())
+        except (ValueError, TypeError):
+            return web.Response(status=400)
+        try:
+            self._queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning(f"Webhook {self.path}: update queue is full ({self.queue_size}), update {update.update_id} "
+                           f"left for redelivery")
+            return web.Response(status=503)
+        return web.Response()
+
+    async def _worker(self):
+        # Контекст aiogram (Bot.get_current() в message.answer и т.п.) у каждой задачи свой
+        Dispatcher.set_current(self.dispatcher)
+        Bot.set_current(self.dispatcher.bot)
+        while True:
+            update = await self._queue.get()
+            try:
+                await self.dispatcher.process_update(update)
+            except Exception as e:
+                logger.error(f"Webhook {self.path}: update {update.update_id} processing error: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def start(self, base_url: str, drop_pending_updates: bool = False):
+        """Запускает воркеров и регистрирует вебхук base_url + path в Telegram"""
+        if self.on_startup is not None:
+            await self.on_startup(self.dispatcher)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        await self.dispatcher.bot.set_webhook(
+            base_url.rstrip("/") + self.path,
+            allowed_updates=self.allowed_updates,
+            drop_pending_updates=drop_pending_updates,
+            secret_token=self.secret
+        )
+        logger.info(f"Webhook {self.path}: {self.workers} workers, queue {self.queue_size}")
+
+    async def stop(self, drain_timeout: float = 30.0):
+        """Дорабатывает принятые апдейты (не дольше drain_timeout) и останавливает воркеров.
+
+        Вебхук в Telegram не удаляется: новые апдейты подождут следующего запуска.
+        """
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Webhook {self.path}: {self._queue.qsize()} updates dropped on shutdown")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.on_shutdown is not None:
+            await self.on_shutdown(self.dispatcher)
+        await (await self.dispatcher.bot.get_session()).close()
+
+
+async def serve(bots: List[WebhookBot], base_url: str, host: str, port: int, stop_event: asyncio.Event,
+                drop_pending_updates: bool = False):
+    """Один HTTP-сервер для всех ботов; работает до stop_event"""
+    app = web.Application()
+    for webhook_bot in bots:
+        app.router.add_post(webhook_bot.path, webhook_bot.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Webhook server on {host}:{port}: {', '.join(webhook_bot.path for webhook_bot in bots)}")
+    try:
+        for webhook_bot in bots:
+            await webhook_bot.start(base_url, drop_pending_updates)
+        await stop_event.wait()
+    finally:
+        # Сначала перестаём принимать запросы, потом дорабатываем очереди
+        await runner.cleanup()
+        for webhook_bot in bots:
+            await webhook_bot.stop()